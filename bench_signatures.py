@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Memory benchmark for V-CONCAT probe results
+
+This script builds a large synthetic manifest of probed clips twice, once with
+the old per-file dicts carrying a "codec_fps" format key and once with shared
+MediaSignature tuples, and reports the memory each needs (tracemalloc) and the
+time taken to find the most common format.
+
+    python bench_signatures.py [--clips 100000] [--formats 8]
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from fractions import Fraction
+
+from vconcat import MediaSignature, intern_signature, find_most_common_format
+
+# Formats a camera library typically mixes, most clips share the first one
+SAMPLE_FORMATS = [
+    ('h264', '30000/1001', 1920, 1080, 'aac', 48000, 2),
+    ('h264', '30/1', 1920, 1080, 'aac', 48000, 2),
+    ('hevc', '30000/1001', 3840, 2160, 'aac', 48000, 2),
+    ('h264', '25/1', 1280, 720, 'aac', 44100, 2),
+    ('hevc', '60000/1001', 3840, 2160, 'pcm_s16le', 48000, 2),
+    ('vp9', '30/1', 1920, 1080, 'opus', 48000, 2),
+    ('h264', '24000/1001', 1920, 1080, 'aac', 48000, 6),
+    ('prores_ks', '25/1', 1920, 1080, None, 0, 0),
+]
+
+def pick_formats(clips, formats, seed=1):
+    """Deterministic, skewed choice of a sample format for every clip."""
+    rng = random.Random(seed)
+    weights = [2 ** (formats - i) for i in range(formats)]
+    return rng.choices(SAMPLE_FORMATS[:formats], weights, k=clips)
+
+def legacy_manifest(choices):
+    """Probe results as they were stored before MediaSignature."""
+    manifest = []
+    for index, (codec, rate, width, height, audio_codec, _, _) in enumerate(choices):
+        num, den = map(int, rate.split('/'))
+        fps = round(num / den, 3)
+        manifest.append({
+            'path': f"/footage/day{index // 1000:03d}/clip{index:06d}.mp4",
+            'codec': codec,
+            'fps': fps,
+            'original_fps': rate,
+            'format_key': f"{codec}_{fps}",
+            'width': width,
+            'height': height,
+            'audio_codec': audio_codec,
+            'duration': 10.0 + index % 50,
+            'bit_rate': 8000000,
+            'size': 10000000 + index,
+        })
+    return manifest
+
+def signature_manifest(choices):
+    """Probe results as get_video_info returns them now."""
+    manifest = []
+    for index, (codec, rate, width, height, audio_codec, sample_rate, channels) in enumerate(choices):
+        manifest.append({
+            'path': f"/footage/day{index // 1000:03d}/clip{index:06d}.mp4",
+            'signature': intern_signature(MediaSignature.create(codec, Fraction(rate), width=width, height=height,
+                                                                audio_codec=audio_codec, sample_rate=sample_rate,
+                                                                channels=channels)),
+            'duration': 10.0 + index % 50,
+            'bit_rate': 8000000,
+            'size': 10000000 + index,
+        })
+    return manifest
+
+def legacy_most_common_format(manifest):
+    """The old string-key grouping, kept here for comparison."""
+    codec, fps = Counter(info['format_key'] for info in manifest).most_common(1)[0][0].split('_')
+    return codec, float(fps)
+
+def measure(name, build, group, choices):
+    """Build a manifest under tracemalloc and time the grouping over it."""
+    tracemalloc.start()
+    manifest = build(choices)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    target = group(manifest)
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:<12} {current / 2**20:9.1f} MB {peak / 2**20:9.1f} MB "
+          f"{current / len(manifest):8.0f} B {elapsed * 1000:9.1f} ms  {target}")
+    return current
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory benchmark for probe results")
+    parser.add_argument("--clips", type=int, default=100000, help="Number of synthetic clips (default: 100000)")
+    parser.add_argument("--formats", type=int, default=len(SAMPLE_FORMATS), choices=range(1, len(SAMPLE_FORMATS) + 1),
+                        metavar="N", help=f"Number of distinct formats (default: {len(SAMPLE_FORMATS)})")
+    args = parser.parse_args()
+
+    choices = pick_formats(args.clips, args.formats)
+    print(f"{args.clips} clips, {args.formats} formats")
+    print(f"{'layout':<12} {'memory':>12} {'peak':>12} {'per clip':>10} {'grouping':>12}  target")
+    legacy = measure('dict+key', legacy_manifest, legacy_most_common_format, choices)
+    compact = measure('signature', signature_manifest, find_most_common_format, choices)
+    print(f"MediaSignature manifest uses {100 * (1 - compact / legacy):.0f}% less memory")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -340,7 +340,8 @@ def main():
         sample_config = {
             "prefer_h264": False,
             "no_encode": False,
-            "comment": "This is a configuration file for V-CONCAT. Set prefer_h264 to true to always prefer H.264 codec with 29.97 fps when possible. Set no_encode to true to skip re-encoding completely."
+            "profile": "balanced",
+            "comment": "This is a configuration file for V-CONCAT. Set prefer_h264 to true to always prefer H.264 codec with 29.97 fps when possible. Set no_encode to true to skip re-encoding completely. Set profile to fast, balanced or archive (or a name from profiles) to pick the encoder speed/quality trade-off."
         }
         try:
             with open(os.path.join(dist_dir, "vconcat.conf"), 'w') as f:
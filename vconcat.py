@@ -29,17 +29,25 @@ Author: Based on lite version of cmd script by Zuko [tansautn@gmail.com]
 import os
 import sys
 import json
+import hashlib
 import subprocess
 import tempfile
 import shutil
 import traceback
 from collections import Counter
+from fractions import Fraction
+from typing import NamedTuple, Optional
 import re
+import fnmatch
 from pathlib import Path
 import platform
 import argparse
 import zipfile
+import urllib.parse
 import urllib.request
+import asyncio
+import signal
+import time
 import shtab
 
 # ASCII Art Banner
@@ -57,6 +65,129 @@ BANNER = """
             * * * * * * * * * * * * * * * * * * * * *     
 """
 DEBUG_MODE = False
+
+# Extensions picked up when scanning folders for input videos
+VIDEO_EXTENSIONS = ('.mp4', '.m4v', '.mov', '.mkv', '.avi', '.webm', '.flv', '.wmv',
+                    '.mpg', '.mpeg', '.ts', '.mts', '.m2ts', '.3gp')
+
+# Orders for --from-dir discovery. mtime needs the whole listing before the first path
+INPUT_SORTS = ('natural', 'name', 'mtime', 'none')
+DEFAULT_INPUT_SORT = 'natural'
+
+# Watch mode keeps its prepared pieces next to the captured clips
+WATCH_WORK_DIR = ".vconcat"
+WATCH_SEAL_FILE = "seal"
+
+# Encoders used for the codec names reported by ffprobe
+CODEC_ENCODERS = {
+    'h264': 'libx264',
+    'hevc': 'libx265',
+    'vp9': 'libvpx-vp9',
+    'av1': 'libsvtav1',
+}
+
+# Named speed/quality profiles. Each profile maps an encoder to its settings:
+# preset, crf, bitrate, maxrate, bufsize, threads, tune, gop and extra (raw args).
+# "balanced" is what the encoders do on their own and stays the default: libx264
+# and libx265 defaults are spelled out, VP9 and AV1 get no settings. AV1 targets
+# always use libsvtav1 rather than whichever AV1 encoder ffmpeg picks by default.
+ENCODER_PROFILES = {
+    'fast': {
+        'libx264': {'preset': 'veryfast', 'crf': 23},
+        'libx265': {'preset': 'veryfast', 'crf': 28},
+        'libvpx-vp9': {'crf': 33, 'bitrate': '0', 'extra': ['-deadline', 'realtime', '-cpu-used', '8', '-row-mt', '1']},
+        'libsvtav1': {'preset': '10', 'crf': 35},
+    },
+    'balanced': {
+        'libx264': {'preset': 'medium', 'crf': 23},
+        'libx265': {'preset': 'medium', 'crf': 28},
+        'libvpx-vp9': {},
+        'libsvtav1': {},
+    },
+    'archive': {
+        'libx264': {'preset': 'slow', 'crf': 18},
+        'libx265': {'preset': 'slow', 'crf': 22},
+        'libvpx-vp9': {'crf': 24, 'bitrate': '0', 'extra': ['-deadline', 'good', '-cpu-used', '1', '-row-mt', '1']},
+        'libsvtav1': {'preset': '4', 'crf': 28},
+    },
+}
+DEFAULT_ENCODER_PROFILE = 'balanced'
+
+# Encoder speed table written by --calibrate, next to vconcat.conf
+SPEED_TABLE_FILE = "vconcat.speed.json"
+
+# Rough single-job encode speeds in frames per second at 1080p, keyed by
+# "encoder/profile". Used by --plan until --calibrate has measured this host.
+DEFAULT_ENCODE_SPEEDS = {
+    'libx264/fast': 180, 'libx264/balanced': 60, 'libx264/archive': 25,
+    'libx265/fast': 45, 'libx265/balanced': 15, 'libx265/archive': 5,
+    'libvpx-vp9/fast': 60, 'libvpx-vp9/balanced': 12, 'libvpx-vp9/archive': 3,
+    'libsvtav1/fast': 90, 'libsvtav1/balanced': 30, 'libsvtav1/archive': 6,
+}
+DEFAULT_ENCODE_SPEED = 30                 # Unknown encoder/profile
+DEFAULT_COPY_SPEED = 200 * 1024 * 1024    # Bytes per second for copy and remux
+DEFAULT_AUDIO_SPEED = 300                 # Seconds of audio encoded per second
+CALIBRATION_PIXELS = 1920 * 1080
+
+# Concurrency settings found by --encode-jobs auto, per host and input class
+TUNING_FILE = "vconcat.tuning.json"
+AUTO_TUNE_WINDOW = 10       # Seconds of encoding measured before each adjustment
+AUTO_TUNE_MAX_LOAD = 1.5    # Load average per CPU above which concurrency is not raised
+
+# Clips in the target codec whose measured frame cadence is within this many
+# percent of the target are retimed: their timestamps already play at the
+# target cadence, so they are joined as they are instead of re-encoded.
+# 0 turns retiming off
+DEFAULT_RETIME_TOLERANCE = 0
+RETIME_CADENCE_SECONDS = 5   # Seconds of video packets read to measure a clip's cadence
+
+# Options of a "path?key=value&..." output rendition
+RENDITION_OPTIONS = ('codec', 'profile', 'width', 'height', 'bitrate')
+
+# Muxer settings for outputs that are read while they are written (stdout, pipes);
+# "-" as output path streams to stdout and defaults to fragmented MP4
+OUTPUT_FORMATS = {
+    'fmp4': ['-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof'],
+    'mpegts': ['-f', 'mpegts'],
+}
+OUTPUT_FORMAT_EXTENSIONS = {'fmp4': '.mp4', 'mpegts': '.ts'}
+STDOUT_OUTPUT = "-"
+
+# Resource governor presets for every ffmpeg/ffprobe child. Settings: nice (0-19),
+# io_class (idle, best-effort, realtime), io_level (0-7), cpus ("0-3,6") and memory_mb.
+GOVERNOR_PROFILES = {
+    'off': {},
+    'polite': {'nice': 10, 'io_class': 'best-effort', 'io_level': 7},
+    'background': {'nice': 19, 'io_class': 'idle'},
+}
+DEFAULT_GOVERNOR = 'off'
+NICE_LEVELS = range(0, 20)  # Only lowering priority, a negative nice would raise it
+IONICE_CLASSES = {'realtime': '1', 'best-effort': '2', 'idle': '3'}
+
+# Active governor, set once from the command line and vconcat.conf
+GOVERNOR = {'name': DEFAULT_GOVERNOR, 'settings': {}}
+
+# Frame rates closer than this are the same format, 2997/100 joins 30000/1001
+FPS_MATCH_TOLERANCE = 0.001
+
+# Child process handling
+PROBE_JOBS = 16              # ffprobe children running at the same time
+PROBE_TIMEOUT = 60           # Seconds before a single probe is given up
+CHILD_TERMINATE_TIMEOUT = 5  # Seconds between asking a child to stop and killing it
+
+# Placement of re-encoded intermediates on --scratch-dir folders
+SCRATCH_POLICIES = ('free-space', 'round-robin')
+DEFAULT_SCRATCH_POLICY = 'free-space'
+SCRATCH_RESERVE = 256 * 2**20   # Bytes always left free on a scratch volume
+SCRATCH_SIZE_MARGIN = 1.25      # Intermediate size estimates are rough
+SCRATCH_RELEASE_MARGIN = 1.0    # Seconds the concat must be past a piece before it is deleted
+
+# Packet-level checks of --verify
+VERIFY_MAX_GAP = 0.5            # Seconds without packets in one stream that count as a gap
+VERIFY_DURATION_TOLERANCE = 0.5 # Seconds the output may differ from the summed inputs...
+VERIFY_SPLICE_SLACK = 0.05      # ...plus this much per joined file
+VERIFY_MAX_ISSUES = 10
+
 def print_banner():
     """Print the application banner."""
     print(BANNER)
@@ -201,73 +332,420 @@ def ensure_ffmpeg():
     print("Please download them manually from: https://ffmpeg.org/download.html")
     return False
 
-def get_video_info(video_path):
-    """Get video codec and fps information using ffprobe."""
+def parse_cpu_list(cpus):
+    """Parse a CPU list like "0-3,6" into a sorted list of CPU numbers."""
+    result = set()
+    for part in str(cpus).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            result.update(range(int(first), int(last) + 1))
+        else:
+            result.add(int(part))
+    return sorted(result)
+
+def resolve_governor(name=None, config=None, overrides=None):
+    """Resolve a governor profile, custom profiles in the config take precedence."""
+    config = config or {}
+    name = name or config.get('governor', DEFAULT_GOVERNOR)
+    profiles = dict(GOVERNOR_PROFILES)
+    profiles.update(config.get('governor_profiles', {}))
+    if name not in profiles:
+        print(f"Unknown governor profile '{name}', using '{DEFAULT_GOVERNOR}'.")
+        name = DEFAULT_GOVERNOR
+    settings = dict(profiles[name])
+    settings.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    nice = settings.get('nice')
+    if nice is not None and (not isinstance(nice, int) or nice not in NICE_LEVELS):
+        print(f"Nice level {nice!r} is outside 0-19, ignored.")
+        del settings['nice']
+    return {'name': name, 'settings': settings}
+
+def parse_nice_level(value):
+    """Parse --nice: a level from 0 to 19."""
+    try:
+        nice = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number from 0 to 19, got '{value}'")
+    if nice not in NICE_LEVELS:
+        raise argparse.ArgumentTypeError(f"must be from 0 to 19, got {nice}")
+    return nice
+
+def set_governor(governor):
+    """Make the governor apply to every child process started from now on."""
+    GOVERNOR['name'] = governor['name']
+    GOVERNOR['settings'] = governor['settings']
+    
+    # Say which settings can't be applied here instead of silently ignoring them
+    settings = governor['settings']
+    if platform.system() == "Windows":
+        ignored = [key for key in ('io_class', 'cpus', 'memory_mb') if settings.get(key)]
+    else:
+        tools = {'nice': "nice", 'io_class': "ionice", 'cpus': "taskset", 'memory_mb': "prlimit"}
+        ignored = [key for key, tool in tools.items() if settings.get(key) is not None and not shutil.which(tool)]
+    if ignored:
+        print(f"Governor: {', '.join(ignored)} not supported on this system, ignored.")
+
+def govern_command(cmd):
+    """Prefix a command with nice/ionice/taskset/prlimit according to the governor."""
+    settings = GOVERNOR['settings']
+    if not settings or platform.system() == "Windows":
+        return cmd
+    
+    prefix = []
+    if settings.get('nice') and shutil.which("nice"):
+        prefix += ["nice", "-n", str(settings['nice'])]
+    if settings.get('io_class') in IONICE_CLASSES and shutil.which("ionice"):
+        prefix += ["ionice", "-c", IONICE_CLASSES[settings['io_class']]]
+        if settings['io_class'] != 'idle' and 'io_level' in settings:
+            prefix += ["-n", str(settings['io_level'])]
+    if settings.get('cpus') is not None and shutil.which("taskset"):
+        prefix += ["taskset", "-c", ",".join(str(cpu) for cpu in parse_cpu_list(settings['cpus']))]
+    if settings.get('memory_mb') and shutil.which("prlimit"):
+        prefix += ["prlimit", f"--as={int(settings['memory_mb']) * 1024 * 1024}"]
+    return prefix + cmd
+
+def get_spawn_options():
+    """Extra Popen arguments for the governor (priority classes on Windows)."""
+    nice = GOVERNOR['settings'].get('nice')
+    if platform.system() != "Windows" or not nice:
+        return {}
+    if nice >= 10:
+        return {'creationflags': subprocess.IDLE_PRIORITY_CLASS}
+    return {'creationflags': subprocess.BELOW_NORMAL_PRIORITY_CLASS}
+
+def get_usable_cpu_count():
+    """Number of CPUs children may use, honouring the governor's CPU affinity."""
+    cpus = GOVERNOR['settings'].get('cpus')
+    if cpus is not None and platform.system() != "Windows":
+        return max(1, len(parse_cpu_list(cpus)))
+    return os.cpu_count() or 1
+
+def open_process(cmd, **kwargs):
+    """subprocess.Popen for ffmpeg/ffprobe children, under the resource governor."""
+    return subprocess.Popen(govern_command(cmd), **get_spawn_options(), **kwargs)
+
+async def stop_process(proc):
+    """Terminate a child process, and kill it if it doesn't exit in time."""
+    if proc.returncode is not None:
+        return
+    try:
+        proc.terminate()
+        await asyncio.wait_for(proc.wait(), CHILD_TERMINATE_TIMEOUT)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+
+def get_console_fd():
+    """File descriptor of the console messages stream, stderr when stdout carries data."""
+    try:
+        return sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+async def run_process(cmd, timeout=None, check=False, capture=False, line_cb=None, data_out=False):
+    """Run an ffmpeg/ffprobe child under the resource governor.
+    
+    With capture the output is returned like subprocess.run, with line_cb every
+    stdout line is handed over as it arrives. On timeout or cancellation the
+    child is stopped before the error is passed on, so nothing is left running.
+    Only a data_out child writes to the real stdout, anything other children
+    print follows the console messages.
+    """
+    pipe_stdout = capture or line_cb is not None
+    if pipe_stdout:
+        stdout = subprocess.PIPE
+    else:
+        stdout = None if data_out else get_console_fd()
+    proc = await asyncio.create_subprocess_exec(
+        *govern_command(cmd),
+        # Keep children away from the console input, they may run in the background
+        stdin=subprocess.DEVNULL,
+        stdout=stdout,
+        stderr=subprocess.PIPE if capture else None,
+        **get_spawn_options()
+    )
+    
+    async def communicate():
+        if line_cb is not None:
+            async for line in proc.stdout:
+                line_cb(line.decode('utf-8', errors='replace'))
+            await proc.wait()
+            return None, None
+        if capture:
+            return await proc.communicate()
+        await proc.wait()
+        return None, None
+    
+    try:
+        stdout, stderr = await asyncio.wait_for(communicate(), timeout)
+    except BaseException:
+        await stop_process(proc)
+        raise
+    
+    if capture:
+        stdout = stdout.decode('utf-8', errors='replace')
+        stderr = stderr.decode('utf-8', errors='replace')
+    if check and proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+def run_async(coro):
+    """Run a coroutine to completion, turning SIGTERM into a clean cancellation."""
+    async def runner():
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        if platform.system() != "Windows":
+            loop.add_signal_handler(signal.SIGTERM, task.cancel)
+        try:
+            return await coro
+        finally:
+            if platform.system() != "Windows":
+                loop.remove_signal_handler(signal.SIGTERM)
+    return asyncio.run(runner())
+
+class MediaSignature(NamedTuple):
+    """Stream parameters that decide whether clips can be joined without re-encoding.
+    
+    Hashable, so it is used directly for grouping and as a cache key. The
+    frame rate is kept exact as numerator and denominator (30000/1001), plain
+    ints hash much faster than a Fraction when grouping large manifests.
+    """
+    codec: str
+    fps_num: int
+    fps_den: int = 1
+    width: int = 0
+    height: int = 0
+    audio_codec: Optional[str] = None
+    sample_rate: int = 0
+    channels: int = 0
+    
+    @classmethod
+    def create(cls, codec, fps, **params):
+        """Build a signature from a Fraction frame rate."""
+        return cls(codec, fps.numerator, fps.denominator, **params)
+    
+    @property
+    def fps(self):
+        """Exact frame rate as a Fraction."""
+        return Fraction(self.fps_num, self.fps_den)
+    
+    @property
+    def video_format(self):
+        """The (codec, rounded fps) key the concat target is chosen from.
+        
+        Rates that round the same, like 2997/100 and 30000/1001, are one format.
+        """
+        return (self.codec, format_fps(self.fps))
+
+# One shared instance per distinct signature, large manifests repeat a handful of them
+_SIGNATURES = {}
+
+def intern_signature(signature):
+    """Return the shared instance equal to signature."""
+    return _SIGNATURES.setdefault(signature, signature)
+
+def parse_frame_rate(rate):
+    """Parse an ffprobe rate like "30000/1001" or "25" into a Fraction, 0 if unknown."""
+    try:
+        return Fraction(rate)
+    except (ValueError, ZeroDivisionError, TypeError):
+        return Fraction(0)
+
+def format_fps(fps):
+    """Frame rate as a short number for messages, reports and folder names."""
+    return round(float(fps), 3)
+
+async def get_video_info(video_path, timeout=PROBE_TIMEOUT):
+    """Get the media signature, duration and size of a video using ffprobe."""
     try:
         cmd = [
             "ffprobe", 
             "-v", "error", 
-            "-select_streams", "v:0", 
-            "-show_entries", "stream=codec_name,r_frame_rate", 
+            "-show_entries", "stream=codec_type,codec_name,r_frame_rate,width,height,sample_rate,channels:format=duration,bit_rate,size", 
             "-of", "json", 
             video_path
         ]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        result = await run_process(cmd, timeout=timeout, check=True, capture=True)
         info = json.loads(result.stdout)
         
-        if 'streams' in info and info['streams']:
-            stream = info['streams'][0]
-            codec = stream.get('codec_name', 'unknown')
+        streams = info.get('streams', [])
+        video_streams = [s for s in streams if s.get('codec_type') == 'video']
+        audio_streams = [s for s in streams if s.get('codec_type') == 'audio']
+        
+        if video_streams:
+            stream = video_streams[0]
+            audio = audio_streams[0] if audio_streams else {}
+            signature = intern_signature(MediaSignature.create(
+                stream.get('codec_name', 'unknown'),
+                # Frame rate is in fraction form like "30000/1001"
+                parse_frame_rate(stream.get('r_frame_rate')),
+                width=int(stream.get('width') or 0),
+                height=int(stream.get('height') or 0),
+                audio_codec=audio.get('codec_name'),
+                sample_rate=int(audio.get('sample_rate') or 0),
+                channels=int(audio.get('channels') or 0),
+            ))
             
-            # Parse frame rate (which might be in fraction form like "30000/1001")
-            r_frame_rate = stream.get('r_frame_rate', 'unknown')
-            if r_frame_rate != 'unknown':
-                if '/' in r_frame_rate:
-                    num, den = map(int, r_frame_rate.split('/'))
-                    fps = round(num / den, 3) if den != 0 else 0
-                else:
-                    fps = float(r_frame_rate)
-            else:
-                fps = 0
-                
+            container = info.get('format', {})
             return {
-                'codec': codec,
-                'fps': fps,
-                'original_fps': r_frame_rate,
-                'format_key': f"{codec}_{fps}"  # Combined key for codec and fps
+                'signature': signature,
+                'duration': float(container.get('duration') or 0),
+                'bit_rate': int(container.get('bit_rate') or 0),
+                'size': int(container.get('size') or 0),
             }
         return None
+    except asyncio.TimeoutError:
+        print(f"Error analyzing {video_path}: ffprobe timed out after {timeout}s")
+        return None
     except Exception as e:
         print(f"Error analyzing {video_path}: {str(e)}")
         return None
 
+async def probe_videos(input_files, jobs=PROBE_JOBS, timeout=PROBE_TIMEOUT):
+    """Probe many videos concurrently. Returns the infos of the valid ones, in input order.
+    
+    input_files may be any iterable, a discovery generator is pulled from a
+    worker thread and each path is probed as soon as a slot is free, so probing
+    starts before a large folder has been walked completely.
+    """
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(jobs)
+    paths = iter(input_files)
+    tasks = []
+    
+    async def probe(file_path):
+        try:
+            info = await get_video_info(file_path, timeout)
+        finally:
+            slots.release()
+        if info:
+            info['path'] = file_path
+            print(f"Analyzed {os.path.basename(file_path)}: Codec: {info['signature'].codec}, FPS: {format_fps(info['signature'].fps)}")
+        else:
+            print(f"  - Failed to analyze {file_path}")
+        return info
+    
+    try:
+        while True:
+            await slots.acquire()
+            file_path = await loop.run_in_executor(None, next, paths, None)
+            if file_path is None:
+                slots.release()
+                break
+            tasks.append(asyncio.ensure_future(probe(file_path)))
+        infos = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return [info for info in infos if info]
+
+def count_formats(video_infos, rates=None):
+    """Count the videos per (codec, rounded fps) format.
+    
+    If a rates Counter is given, the videos per (format, exact fps) are
+    added to it.
+    """
+    # Interned signatures are few, so count those first and fold them into formats
+    formats = Counter()
+    for signature, count in Counter([info['signature'] for info in video_infos if info]).items():
+        formats[signature.video_format] += count
+        if rates is not None:
+            rates[signature.video_format, signature.fps] += count
+    return formats
+
 def find_most_common_format(video_infos, prefer_h264=False):
     """Find the most common codec and fps combination among the videos."""
     if not video_infos:
         return None, None
     
-    # Count combined codec_fps format keys
-    format_keys = Counter([info['format_key'] for info in video_infos if info])
+    rates = Counter()
+    formats = count_formats(video_infos, rates)
     
-    if not format_keys:
+    if not formats:
         return None, None
     
-    # Get the most common format key
-    most_common_format = format_keys.most_common(1)[0][0]
-    most_common_count = format_keys.most_common(1)[0][1]
-    # print(f"Most common format: {most_common_format} (count: {most_common_count})")
-    
-    # Extract codec and fps from the format key
-    codec, fps_str = most_common_format.split('_')
-    fps = float(fps_str)
+    # Get the most common format, encoded to its most common exact rate
+    video_format, most_common_count = formats.most_common(1)[0]
+    codec = video_format[0]
+    fps = max((rate for format_key, rate in rates if format_key == video_format),
+              key=lambda rate: rates[video_format, rate])
+    # print(f"Most common format: {codec} {fps} (count: {most_common_count})")
     
     # Check if we should prefer H.264 with 29.97 fps
     if prefer_h264 and codec != 'h264' and most_common_count >= 3:
         # print("Prefer H.264 option is enabled. Using H.264 codec with 29.97 fps instead.")
-        return 'h264', 29.97
+        return 'h264', Fraction(30000, 1001)
     
     return codec, fps
 
+def matches_target_format(info, target_codec, target_fps):
+    """Check whether a probed video already has the target codec and fps, within FPS_MATCH_TOLERANCE."""
+    signature = info['signature']
+    return signature.codec == target_codec and abs(float(signature.fps) - float(target_fps)) < FPS_MATCH_TOLERANCE
+
+def can_retime(info, target_codec, target_fps, tolerance=DEFAULT_RETIME_TOLERANCE, cadence=None):
+    """Whether a video only differs from the target in a frame rate within tolerance percent.
+    
+    cadence is the frame rate measured from the packet timestamps
+    (measure_cadence), the probed r_frame_rate is only what the container
+    claims. Without a measured cadence nothing is retimed.
+    """
+    if not tolerance or not cadence or not target_fps or info['signature'].codec != target_codec:
+        return False
+    return abs(cadence / float(target_fps) - 1) * 100 <= tolerance
+
+async def measure_cadence(video_path, timeout=PROBE_TIMEOUT):
+    """Measure a video's frame rate from the timestamps of its first video packets, None if unknown."""
+    times = []
+    
+    def on_packet(line):
+        try:
+            times.append(float(line.strip().rstrip(',')))
+        except ValueError:
+            pass  # Packets without a presentation timestamp
+    
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-read_intervals", f"%+{RETIME_CADENCE_SECONDS}",
+           "-show_entries", "packet=pts_time", "-of", "csv=p=0", video_path]
+    try:
+        await run_process(cmd, timeout=timeout, check=True, line_cb=on_packet)
+    except asyncio.TimeoutError:
+        print(f"Error measuring the frame rate of {video_path}: ffprobe timed out after {timeout}s")
+        return None
+    except Exception as e:
+        print(f"Error measuring the frame rate of {video_path}: {str(e)}")
+        return None
+    # Packets come in decoding order, B-frames put presentation times out of order
+    times.sort()
+    if len(times) < 2 or times[-1] <= times[0]:
+        return None
+    return (len(times) - 1) / (times[-1] - times[0])
+
+async def find_retimes(video_infos, target_codec, target_fps, tolerance, jobs=PROBE_JOBS, timeout=PROBE_TIMEOUT):
+    """Paths of the videos off the target format that can be retimed instead of re-encoded.
+    
+    Only videos already in the target codec are candidates, their cadence is
+    measured jobs at a time.
+    """
+    candidates = [info for info in video_infos
+                  if tolerance and info['signature'].codec == target_codec
+                  and not matches_target_format(info, target_codec, target_fps)]
+    slots = asyncio.Semaphore(jobs)
+    
+    async def check(info):
+        async with slots:
+            cadence = await measure_cadence(info['path'], timeout)
+        return can_retime(info, target_codec, target_fps, tolerance, cadence)
+    
+    results = await asyncio.gather(*(check(info) for info in candidates))
+    return {info['path'] for info, retime in zip(candidates, results) if retime}
+
 def sanitize_filename(filename):
     """Sanitize filename to avoid issues with special characters."""
     # Replace problematic characters with underscores
@@ -275,19 +753,85 @@ def sanitize_filename(filename):
     return sanitized
 
 def get_temp_filename(original_path, temp_dir):
-    """Generate a temporary filename for re-encoded videos."""
+    """Generate a temporary filename for re-encoded videos.
+    
+    A hash of the full path keeps clips with the same name in different
+    folders apart, and gives the same name again on the next run.
+    """
     base_name = os.path.basename(original_path)
     sanitized_name = sanitize_filename(base_name)
-    return os.path.join(temp_dir, f"reencoded_{sanitized_name}")
+    digest = hashlib.sha1(os.path.abspath(original_path).encode('utf-8', errors='surrogateescape')).hexdigest()[:10]
+    return os.path.join(temp_dir, f"reencoded_{digest}_{sanitized_name}")
+
+def resolve_encoder_profile(name=None, config=None):
+    """Resolve a named encoder profile, custom profiles in the config take precedence."""
+    config = config or {}
+    name = name or config.get('profile', DEFAULT_ENCODER_PROFILE)
+    profiles = dict(ENCODER_PROFILES)
+    profiles.update(config.get('profiles', {}))
+    if name not in profiles:
+        print(f"Unknown encoder profile '{name}', using '{DEFAULT_ENCODER_PROFILE}'.")
+        name = DEFAULT_ENCODER_PROFILE
+    return {'name': name, 'encoders': profiles[name]}
+
+def get_encoder_args(target_codec, profile=None, threads=None):
+    """Build the ffmpeg video encoder arguments for the target codec and profile."""
+    encoder = CODEC_ENCODERS.get(target_codec, target_codec)
+    args = ["-c:v", encoder]
+    settings = dict((profile or {}).get('encoders', {}).get(encoder, {}))
+    if threads:
+        settings['threads'] = threads
+
+    if 'preset' in settings:
+        args += ["-preset", str(settings['preset'])]
+    if 'tune' in settings:
+        args += ["-tune", str(settings['tune'])]
+    if 'crf' in settings:
+        args += ["-crf", str(settings['crf'])]
+    if 'bitrate' in settings:
+        args += ["-b:v", str(settings['bitrate'])]
+    if 'maxrate' in settings:
+        args += ["-maxrate", str(settings['maxrate'])]
+    if 'bufsize' in settings:
+        args += ["-bufsize", str(settings['bufsize'])]
+    if 'gop' in settings:
+        args += ["-g", str(settings['gop'])]
+    if 'threads' in settings:
+        args += ["-threads", str(settings['threads'])]
+    args += [str(arg) for arg in settings.get('extra', [])]
+    return args
+
+async def run_ffmpeg(cmd, progress_cb=None, timeout=None, data_out=False, time_cb=None):
+    """Run an ffmpeg command, reporting newly encoded frames to progress_cb and
+    the output position in seconds to time_cb if given."""
+    if progress_cb is None and time_cb is None:
+        await run_process(cmd, timeout=timeout, check=True, data_out=data_out)
+        return
+    
+    frames_done = 0
+    
+    def on_progress(line):
+        nonlocal frames_done
+        key, _, value = line.strip().partition('=')
+        if key == 'frame' and value.isdigit() and progress_cb:
+            progress_cb(int(value) - frames_done)
+            frames_done = int(value)
+        elif key in ('out_time_us', 'out_time_ms') and value.isdigit() and time_cb:
+            # Both keys are in microseconds
+            time_cb(int(value) / 1000000)
+    
+    cmd = cmd[:1] + ["-progress", "pipe:1", "-nostats"] + cmd[1:]
+    await run_process(cmd, timeout=timeout, check=True, line_cb=on_progress)
 
-def reencode_video(input_path, output_path, target_codec, target_fps):
+async def reencode_video(input_path, output_path, target_codec, target_fps, profile=None,
+                         progress_cb=None, threads=None, timeout=None):
     """Re-encode a video to match the target codec and fps."""
     try:
         cmd = [
             "ffmpeg",
             "-hide_banner",
             "-i", input_path,
-            "-c:v", target_codec,
+            *get_encoder_args(target_codec, profile, threads),
             "-r", str(target_fps),
             "-c:a", "aac",  # Always use AAC for audio
             "-y",  # Overwrite output file if it exists
@@ -296,53 +840,1271 @@ def reencode_video(input_path, output_path, target_codec, target_fps):
         
         print(f"Re-encoding {os.path.basename(input_path)} to match common format...")
         print(f"Command: {' '.join(cmd)}")
-        subprocess.run(cmd, check=True)
+        await run_ffmpeg(cmd, progress_cb, timeout)
         return True
+    except asyncio.TimeoutError:
+        print(f"Error re-encoding {input_path}: timed out after {timeout}s")
+        cleanup_temp_files(output_path)
+        return False
+    except asyncio.CancelledError:
+        cleanup_temp_files(output_path)
+        raise
     except Exception as e:
         print(f"Error re-encoding {input_path}: {str(e)}")
+        cleanup_temp_files(output_path)
         return False
 
-def concatenate_videos(file_list, output_path):
-    """Concatenate videos using ffmpeg's concat demuxer."""
-    try:
-        # Create a temporary file list
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as temp_file:
-            for file_path in file_list:
-                # Escape single quotes in file paths
-                escaped_path = file_path.replace("'", "'\\''")
-                temp_file.write(f"file '{escaped_path}'\n")
-            temp_file_path = temp_file.name
-        
-        # Run ffmpeg concat
-        cmd = [
-            "ffmpeg",
-            "-hide_banner",
-            "-f", "concat",
-            "-safe", "0",
-            "-i", temp_file_path,
+def parse_output_spec(spec):
+    """Parse an output like "preview.mp4?codec=h264&profile=fast&height=360".
+    
+    Without options the output is a stream copy of the concatenation. Any of
+    codec, profile, width, height or bitrate makes it a transcoded rendition
+    (codec defaults to h264). format=fmp4|mpegts picks a streamable muxer.
+    """
+    # Only a trailing "?key=value&..." of known options is read as options, so
+    # a file name that merely contains '?' stays a plain path
+    path, _, query = spec.rpartition('?')
+    fields = query.split('&')
+    if not path or not all(key in RENDITION_OPTIONS + ('format',) and sep
+                           for key, sep, _ in (field.partition('=') for field in fields)):
+        path, query = spec, ''
+    rendition = {'path': path.strip('"\''), 'codec': None, 'profile': None,
+                 'width': None, 'height': None, 'bitrate': None, 'format': None}
+    for key, value in urllib.parse.parse_qsl(query, keep_blank_values=True):
+        if key == 'format' and value not in OUTPUT_FORMATS:
+            raise argparse.ArgumentTypeError(f"unknown output format '{value}' in '{spec}'")
+        if key in ('width', 'height'):
+            try:
+                value = int(value)
+            except ValueError:
+                raise argparse.ArgumentTypeError(f"invalid {key} '{value}' in '{spec}'")
+        rendition[key] = value
+    if not rendition['path']:
+        raise argparse.ArgumentTypeError(f"missing output path in '{spec}'")
+    if any(rendition[key] for key in RENDITION_OPTIONS) and not rendition['codec']:
+        rendition['codec'] = 'h264'
+    return rendition
+
+def resolve_renditions(renditions, profile, config=None, output_format=None):
+    """Attach an encoder profile to each transcoded rendition, the run's profile by default.
+    
+    output_format applies to outputs without their own format, stdout falls back to fmp4.
+    """
+    for rendition in renditions:
+        rendition['format'] = rendition.get('format') or output_format
+        if is_stdout_output(rendition) and not rendition['format']:
+            rendition['format'] = 'fmp4'
+        if rendition['codec']:
+            rendition['encoder_profile'] = resolve_encoder_profile(rendition['profile'] or profile['name'], config)
+    return renditions
+
+def as_renditions(outputs):
+    """Accept a single output path or a list of parsed renditions."""
+    if isinstance(outputs, str):
+        return [parse_output_spec(outputs)]
+    return outputs
+
+def get_output_paths(outputs):
+    """Paths of all outputs, for messages and reports."""
+    return [rendition['path'] for rendition in as_renditions(outputs)]
+
+def is_stdout_output(rendition):
+    """Whether a rendition is streamed to stdout."""
+    return rendition['path'] == STDOUT_OUTPUT
+
+def get_ffmpeg_output(rendition):
+    """Output path as given to ffmpeg."""
+    return "pipe:1" if is_stdout_output(rendition) else rendition['path']
+
+def get_output_extension(rendition):
+    """Container extension of an output, from its format or its path."""
+    if rendition.get('format'):
+        return OUTPUT_FORMAT_EXTENSIONS[rendition['format']]
+    return Path(rendition['path']).suffix.lower()
+
+def get_format_args(rendition):
+    """Muxer arguments of a rendition with an explicit output format."""
+    return list(OUTPUT_FORMATS[rendition['format']]) if rendition.get('format') else []
+
+def escape_tee_path(path):
+    """Quote a path for a tee muxer slave."""
+    return "'" + path.replace("'", "'\\''") + "'"
+
+def get_tee_slave(rendition):
+    """Tee muxer slave for a copy output, with its muxer options if it has a format."""
+    args = get_format_args(rendition)
+    options = ""
+    if args:
+        # ["-f", "mp4", "-movflags", "..."] -> "[f=mp4:movflags=...]"
+        options = "[" + ":".join(f"{args[i].lstrip('-')}={args[i + 1]}" for i in range(0, len(args), 2)) + "]"
+    return options + escape_tee_path(get_ffmpeg_output(rendition))
+
+def remove_partial_output(rendition):
+    """Remove an output left behind by a failed concat. Streams and pipes are left alone."""
+    path = rendition['path']
+    if not is_stdout_output(rendition) and os.path.isfile(path):
+        os.unlink(path)
+
+def get_rendition_args(rendition):
+    """Encoder and scaling arguments for a transcoded rendition."""
+    args = get_encoder_args(rendition['codec'], rendition.get('encoder_profile'))
+    if rendition.get('bitrate'):
+        # An explicit bitrate replaces the profile's rate control
+        if '-crf' in args:
+            index = args.index('-crf')
+            del args[index:index + 2]
+        args += ["-b:v", str(rendition['bitrate'])]
+    return args
+
+def build_concat_command(list_path, outputs):
+    """Build the ffmpeg concat command writing every output from a single read of the inputs.
+    
+    Copy outputs share one stream copy through the tee muxer, transcoded
+    renditions each get a branch of one split filtergraph.
+    """
+    renditions = as_renditions(outputs)
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", list_path,
+    ]
+    copies = [r for r in renditions if not r['codec']]
+    transcodes = [r for r in renditions if r['codec']]
+    
+    if len(copies) == 1 and not transcodes:
+        return cmd + [
             "-c:v", "copy",  # Use copy since all videos now have the same format
             "-c:a", "aac",  # Always use AAC for audio
+            *get_format_args(copies[0]),
             "-y",  # Overwrite output file if it exists
-            output_path
+            get_ffmpeg_output(copies[0])
         ]
+    
+    if transcodes:
+        # Decode once, one scaled branch per rendition
+        branches = "".join(f"[v{i}]" for i in range(len(transcodes)))
+        graph = [f"[0:v:0]split={len(transcodes)}{branches}"]
+        for i, rendition in enumerate(transcodes):
+            width = rendition.get('width') or -2
+            height = rendition.get('height') or -2
+            if rendition.get('width') or rendition.get('height'):
+                graph.append(f"[v{i}]scale={width}:{height}[r{i}]")
+            else:
+                graph.append(f"[v{i}]null[r{i}]")
+        cmd += ["-filter_complex", ";".join(graph)]
+    
+    if len(copies) == 1:
+        cmd += ["-map", "0:v:0", "-map", "0:a:0?", "-c:v", "copy", "-c:a", "aac",
+                *get_format_args(copies[0]), "-y", get_ffmpeg_output(copies[0])]
+    elif copies:
+        slaves = "|".join(get_tee_slave(r) for r in copies)
+        cmd += ["-map", "0:v:0", "-map", "0:a:0?", "-c:v", "copy", "-c:a", "aac",
+                "-flags", "+global_header", "-f", "tee", "-y", slaves]
+    for i, rendition in enumerate(transcodes):
+        cmd += ["-map", f"[r{i}]", "-map", "0:a:0?", *get_rendition_args(rendition),
+                "-c:a", "aac", *get_format_args(rendition), "-y", get_ffmpeg_output(rendition)]
+    return cmd
+
+async def concatenate_videos(file_list, outputs, timeout=None, disposable=None):
+    """Concatenate videos using ffmpeg's concat demuxer, writing one or more outputs.
+    
+    disposable lists (end offset in seconds, path) of intermediates that are
+    deleted as soon as the concat has moved past them. Progress comes from
+    stdout, so nothing is deleted early while streaming to stdout.
+    """
+    renditions = as_renditions(outputs)
+    output_paths = get_output_paths(renditions)
+    streaming = any(is_stdout_output(r) for r in renditions)
+    pending = sorted(disposable or [])
+    
+    def release_pieces(seconds):
+        while pending and seconds > pending[0][0] + SCRATCH_RELEASE_MARGIN:
+            _, path = pending.pop(0)
+            try:
+                os.unlink(path)
+            except OSError:
+                pass  # Still open on Windows, removed with its scratch folder
+    # Create a temporary file list
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as temp_file:
+        for file_path in file_list:
+            # Escape single quotes in file paths
+            escaped_path = file_path.replace("'", "'\\''")
+            temp_file.write(f"file '{escaped_path}'\n")
+        temp_file_path = temp_file.name
+    
+    try:
+        # Run ffmpeg concat
+        cmd = build_concat_command(temp_file_path, renditions)
         
-        print(f"\nConcatenating {len(file_list)} videos into {output_path}...")
+        print(f"\nConcatenating {len(file_list)} videos into {', '.join(output_paths)}...")
         print(f"Command: {' '.join(cmd)}")
-        subprocess.run(cmd, check=True)
-        
-        # Clean up
-        DEBUG_MODE and cleanup_temp_files(temp_file_path)
+        await run_ffmpeg(cmd, timeout=timeout, data_out=streaming,
+                         time_cb=release_pieces if pending and not streaming else None)
         return True
+    except asyncio.TimeoutError:
+        print(f"Error concatenating videos: timed out after {timeout}s")
+        for rendition in renditions:
+            remove_partial_output(rendition)
+        return False
+    except asyncio.CancelledError:
+        for rendition in renditions:
+            remove_partial_output(rendition)
+        raise
     except Exception as e:
         print(f"Error concatenating videos: {str(e)}")
-        DEBUG_MODE and cleanup_temp_files(temp_file_path)
+        for rendition in renditions:
+            remove_partial_output(rendition)
         return False
-    
+    finally:
+        cleanup_temp_files(temp_file_path)
+
 def cleanup_temp_files(temp_file_path):
     if os.path.exists(temp_file_path):
             os.unlink(temp_file_path)
     return True
 
+def get_splice_points(infos):
+    """Offsets in seconds where each joined file after the first starts."""
+    points = []
+    offset = 0.0
+    for info in infos[:-1]:
+        offset += info.get('duration', 0)
+        points.append(offset)
+    return points
+
+def describe_position(seconds, infos, splice_points):
+    """Describe a time in the output, naming the splice it is at if any."""
+    for index, point in enumerate(splice_points):
+        if abs(seconds - point) <= 1.0:
+            return f"{seconds:.3f}s (splice {index + 1}, start of {os.path.basename(infos[index + 1]['path'])})"
+    return f"{seconds:.3f}s"
+
+async def verify_output(path, infos, timeout=None):
+    """Check a concatenated output at the packet level, without decoding anything.
+    
+    The duration is compared with the sum of the joined inputs' probed
+    durations and the stream count with the first input. Packet timestamps
+    of every stream must keep increasing, without gaps, in particular at
+    the splice points. Returns the report entry.
+    """
+    started = time.monotonic()
+    expected_duration = sum(info.get('duration', 0) for info in infos)
+    splice_points = get_splice_points(infos)
+    result = {
+        'path': path,
+        'passed': False,
+        'duration': 0.0,
+        'expected_duration': round(expected_duration, 3),
+        'streams': 0,
+        'expected_streams': 2 if infos[0]['signature'].audio_codec else 1,
+        'splices': len(splice_points),
+        'issues': [],
+    }
+    issues = result['issues']
+    
+    def add_issue(message):
+        if len(issues) < VERIFY_MAX_ISSUES:
+            issues.append(message)
+        elif len(issues) == VERIFY_MAX_ISSUES:
+            issues.append("more issues not listed")
+    
+    last_packets = {}  # stream index -> (dts, duration) of its previous packet
+    
+    def on_packet(line):
+        fields = dict(field.split('=', 1) for field in line.strip().split('|') if '=' in field)
+        try:
+            stream = fields['stream_index']
+            dts = float(fields['dts_time'])
+        except (KeyError, ValueError):
+            return  # Packets without a decoding timestamp
+        try:
+            duration = float(fields.get('duration_time'))
+        except (TypeError, ValueError):
+            duration = 0.0
+        if stream in last_packets:
+            last_dts, last_duration = last_packets[stream]
+            gap = dts - (last_dts + last_duration)
+            if dts <= last_dts:
+                add_issue(f"stream {stream} timestamps go back {last_dts - dts:.3f}s at "
+                          f"{describe_position(dts, infos, splice_points)}")
+            elif gap > VERIFY_MAX_GAP:
+                add_issue(f"stream {stream} has a {gap:.3f}s gap at "
+                          f"{describe_position(dts, infos, splice_points)}")
+        last_packets[stream] = (dts, duration)
+    
+    try:
+        cmd = ["ffprobe", "-v", "error", "-show_entries", "stream=index:format=duration", "-of", "json", path]
+        container = json.loads((await run_process(cmd, timeout=timeout, check=True, capture=True)).stdout)
+        result['streams'] = len(container.get('streams', []))
+        result['duration'] = round(float(container.get('format', {}).get('duration') or 0), 3)
+        tolerance = VERIFY_DURATION_TOLERANCE + VERIFY_SPLICE_SLACK * len(infos)
+        if abs(result['duration'] - expected_duration) > tolerance:
+            add_issue(f"duration {result['duration']:.3f}s, expected {expected_duration:.3f}s")
+        if result['streams'] != result['expected_streams']:
+            add_issue(f"{result['streams']} streams, expected {result['expected_streams']}")
+        
+        # Packet headers only, nothing is decoded
+        cmd = ["ffprobe", "-v", "error", "-show_entries", "packet=stream_index,dts_time,duration_time",
+               "-of", "compact=p=0", path]
+        await run_process(cmd, timeout=timeout, check=True, line_cb=on_packet)
+    except asyncio.TimeoutError:
+        add_issue(f"verification timed out after {timeout}s")
+    except Exception as e:
+        add_issue(f"cannot read output: {str(e)}")
+    
+    result['passed'] = not issues
+    result['seconds'] = round(time.monotonic() - started, 3)
+    return result
+
+async def verify_outputs(outputs, infos, report=None, timeout=None):
+    """Verify every file output of a concat, print a pass/fail line each and add them to the report."""
+    renditions = [r for r in as_renditions(outputs) if not is_stdout_output(r)]
+    if not renditions:
+        return True
+    print("\nVerifying output...")
+    results = await asyncio.gather(*(verify_output(r['path'], infos, timeout) for r in renditions))
+    for result in results:
+        print(f"Verify {result['path']}: {'PASS' if result['passed'] else 'FAIL'} "
+              f"(duration {result['duration']:.3f}s / expected {result['expected_duration']:.3f}s, "
+              f"{result['streams']} streams, {result['splices']} splices, checked in {result['seconds']:.1f}s)")
+        for issue in result['issues']:
+            print(f"  - {issue}")
+    if report is not None:
+        report['verify'] = results
+    return all(result['passed'] for result in results)
+
+def redirect_messages_to_stderr():
+    """Send console messages to stderr so stdout only carries data. Returns the real stdout."""
+    data_out = sys.stdout
+    sys.stdout = sys.stderr
+    return data_out
+
+def load_speed_table():
+    """Load the encoder speed table measured by --calibrate, if any."""
+    table_path = os.path.join(get_application_path(), SPEED_TABLE_FILE)
+    table = {}
+    if os.path.exists(table_path):
+        try:
+            with open(table_path, 'r') as f:
+                table = json.load(f)
+        except Exception as e:
+            print(f"Error loading speed table: {str(e)}")
+    table.setdefault('encoders', {})
+    table.setdefault('copy_speed', DEFAULT_COPY_SPEED)
+    table.setdefault('audio_speed', DEFAULT_AUDIO_SPEED)
+    return table
+
+def get_encode_speed(speed_table, encoder, profile_name, jobs=1):
+    """Get the aggregate 1080p encode speed (fps) of `jobs` parallel encodes.
+
+    Uses the closest calibrated job count that doesn't exceed `jobs`. Without
+    calibration, parallel jobs are assumed to gain nothing over a single one.
+    """
+    key = f"{encoder}/{profile_name}"
+    measured = speed_table['encoders'].get(key, {})
+    counts = [int(count) for count in measured if int(count) <= jobs]
+    if counts:
+        return measured[str(max(counts))]
+    return DEFAULT_ENCODE_SPEEDS.get(key, DEFAULT_ENCODE_SPEED)
+
+def measure_encode_speed(encoder_args, jobs=1, seconds=5):
+    """Encode a synthetic 1080p30 clip `jobs` times in parallel, return the aggregate fps."""
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-v", "error",
+        "-f", "lavfi",
+        "-i", f"testsrc2=size=1920x1080:rate=30:duration={seconds}",
+        *encoder_args,
+        "-f", "null", "-"
+    ]
+    start = time.time()
+    procs = [open_process(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+             for _ in range(jobs)]
+    try:
+        # Reap every encoder before judging the run, so none is left for the next step
+        return_codes = [proc.wait() for proc in procs]
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+    if any(code != 0 for code in return_codes):
+        return None
+    return round(jobs * seconds * 30 / (time.time() - start), 1)
+
+def calibrate_encoder_speeds(profile, encode_jobs=1):
+    """Measure this host's encoder speeds for the profile and store them in the speed table."""
+    table = load_speed_table()
+    job_counts = sorted({1, encode_jobs})
+    print(f"\nCalibrating encoder speeds for profile '{profile['name']}'...")
+    for codec in CODEC_ENCODERS:
+        encoder_args = get_encoder_args(codec, profile)
+        key = f"{encoder_args[1]}/{profile['name']}"
+        for jobs in job_counts:
+            fps = measure_encode_speed(encoder_args, jobs)
+            if fps is None:
+                print(f"  - {key}: encoder not available, skipped")
+                break
+            table['encoders'].setdefault(key, {})[str(jobs)] = fps
+            print(f"  - {key} x{jobs}: {fps} fps")
+    table['host'] = platform.node()
+    table['calibrated'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    table_path = os.path.join(get_application_path(), SPEED_TABLE_FILE)
+    try:
+        with open(table_path, 'w') as f:
+            json.dump(table, f, indent=4)
+        print(f"Speed table saved to {table_path}")
+        return True
+    except Exception as e:
+        print(f"Error saving speed table: {str(e)}")
+        return False
+
+def benchmark_governors(profile, config=None):
+    """Measure how much encode throughput each governor profile costs on this host."""
+    names = list(GOVERNOR_PROFILES) + [name for name in (config or {}).get('governor_profiles', {})
+                                       if name not in GOVERNOR_PROFILES]
+    encoder_args = get_encoder_args('h264', profile)
+    active = dict(GOVERNOR)
+    results = {}
+    
+    print(f"\nMeasuring governor profiles with {encoder_args[1]}/{profile['name']} under the current load...")
+    try:
+        for name in names:
+            set_governor(resolve_governor(name, config))
+            results[name] = measure_encode_speed(encoder_args)
+    finally:
+        set_governor(active)
+    
+    baseline = results.get('off')
+    for name, fps in results.items():
+        if fps is None:
+            print(f"  - {name}: encode failed")
+        elif baseline:
+            print(f"  - {name}: {fps} fps ({(1 - fps / baseline) * 100:+.1f}% cost vs off)")
+        else:
+            print(f"  - {name}: {fps} fps")
+    return results
+
+def classify_video(info, target_codec, target_fps, output_ext, no_encode=False, retimes=None):
+    """Decide how a video gets into the output: copy, remux, audio-only, retime or reencode.
+    
+    retimes holds the paths find_retimes accepted.
+    """
+    if not no_encode and not matches_target_format(info, target_codec, target_fps):
+        if retimes and info['path'] in retimes:
+            return 'retime'
+        return 'reencode'
+    if info['signature'].audio_codec not in (None, 'aac'):
+        return 'audio-only'
+    if Path(info['path']).suffix.lower() != output_ext:
+        return 'remux'
+    return 'copy'
+
+def estimate_intermediate_size(info):
+    """Estimate the size in bytes of a re-encoded copy from the probed bitrate and duration."""
+    if info.get('bit_rate') and info.get('duration'):
+        return int(info['bit_rate'] * info['duration'] / 8)
+    return info.get('size', 0)
+
+def get_rendition_pixels(rendition, source_width, source_height):
+    """Pixels per frame of a rendition; a missing dimension follows the source aspect ratio."""
+    width = rendition.get('width') or 0
+    height = rendition.get('height') or 0
+    if width and height:
+        return width * height
+    if width:
+        return width * width * source_height // source_width
+    if height:
+        return height * height * source_width // source_height
+    return source_width * source_height
+
+def build_plan(video_infos, target_codec, target_fps, outputs, profile,
+               encode_jobs=1, no_encode=False, speed_table=None, retimes=None):
+    """Build the --plan description of a job without encoding anything."""
+    renditions = as_renditions(outputs)
+    output_ext = get_output_extension(renditions[0])
+    speed_table = speed_table or load_speed_table()
+    encoder = CODEC_ENCODERS.get(target_codec, target_codec)
+    aggregate_fps = get_encode_speed(speed_table, encoder, profile['name'], encode_jobs)
+    job_fps = aggregate_fps / encode_jobs
+
+    files = []
+    encode_times = []
+    concat_seconds = 0.0
+    for info in video_infos:
+        # The concat converts every file's audio to AAC, whatever happens to its video
+        concat_audio_seconds = info.get('duration', 0) / speed_table['audio_speed']
+        action = classify_video(info, target_codec, target_fps, output_ext, no_encode, retimes)
+        entry = {
+            'path': info['path'],
+            'codec': info['signature'].codec,
+            'fps': format_fps(info['signature'].fps),
+            'width': info['signature'].width,
+            'height': info['signature'].height,
+            'duration': info.get('duration', 0),
+            'action': action,
+            'scratch_bytes': 0,
+        }
+        if action == 'reencode':
+            # Encoding cost scales with frames and pixels, relative to the 1080p calibration
+            pixels = (entry['width'] * entry['height']) or CALIBRATION_PIXELS
+            frames = entry['duration'] * target_fps
+            seconds = frames * pixels / CALIBRATION_PIXELS / job_fps
+            entry['scratch_bytes'] = estimate_intermediate_size(info)
+            encode_times.append(seconds)
+            concat_seconds += entry['scratch_bytes'] / speed_table['copy_speed'] + concat_audio_seconds
+        else:
+            # copy, remux, audio-only and retime all pay for the AAC encode in the concat
+            seconds = info.get('size', 0) / speed_table['copy_speed'] + concat_audio_seconds
+            concat_seconds += seconds
+        entry['estimated_seconds'] = round(seconds, 2)
+        files.append(entry)
+
+    # Transcoded renditions are encoded during the concat pass, from one decode
+    total_frames = sum(info.get('duration', 0) for info in video_infos) * target_fps
+    sizes = Counter((info['signature'].width, info['signature'].height) for info in video_infos
+                    if info['signature'].width and info['signature'].height)
+    source_width, source_height = sizes.most_common(1)[0][0] if sizes else (1920, 1080)
+    for rendition in renditions:
+        if not rendition['codec']:
+            continue
+        rendition_profile = rendition.get('encoder_profile') or profile
+        rendition_encoder = CODEC_ENCODERS.get(rendition['codec'], rendition['codec'])
+        pixels = get_rendition_pixels(rendition, source_width, source_height)
+        concat_seconds += total_frames * pixels / CALIBRATION_PIXELS / get_encode_speed(
+            speed_table, rendition_encoder, rendition_profile['name'])
+
+    # Longest jobs first onto the least busy worker
+    workers = [0.0] * encode_jobs
+    for seconds in sorted(encode_times, reverse=True):
+        workers[workers.index(min(workers))] += seconds
+
+    return {
+        'outputs': [{'path': r['path'], 'codec': r['codec'] or 'copy'} for r in renditions],
+        'profile': profile['name'],
+        'target': {'codec': target_codec, 'fps': format_fps(target_fps)},
+        'encoder_args': get_encoder_args(target_codec, profile),
+        'encode_jobs': encode_jobs,
+        'speed_table': 'calibrated' if speed_table['encoders'] else 'default',
+        'files': files,
+        'totals': {
+            'files': len(files),
+            'reencode': sum(1 for entry in files if entry['action'] == 'reencode'),
+            'retime': sum(1 for entry in files if entry['action'] == 'retime'),
+            'encode_cpu_seconds': round(sum(encode_times), 2),
+            'encode_wall_seconds': round(max(workers), 2),
+            'concat_seconds': round(concat_seconds, 2),
+            'wall_seconds': round(max(workers) + concat_seconds, 2),
+            'scratch_bytes': sum(entry['scratch_bytes'] for entry in files),
+            'output_bytes': sum(estimate_intermediate_size(info) for info in video_infos),
+        },
+    }
+
+def parse_encode_jobs(value):
+    """Parse --encode-jobs: a positive number or 'auto'."""
+    if str(value).lower() == 'auto':
+        return 'auto'
+    try:
+        jobs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number or 'auto', got '{value}'")
+    if jobs < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return jobs
+
+def get_input_class(video_infos, target_codec, profile):
+    """Describe a batch of encodes by encoder, profile and resolution for auto-tuning."""
+    height = max([info['signature'].height for info in video_infos] or [0])
+    if height <= 576:
+        resolution = 'sd'
+    elif height <= 720:
+        resolution = '720p'
+    elif height <= 1080:
+        resolution = '1080p'
+    elif height <= 2160:
+        resolution = '2160p'
+    else:
+        resolution = '4320p'
+    encoder = CODEC_ENCODERS.get(target_codec, target_codec)
+    return f"{encoder}/{profile['name']}/{resolution}"
+
+def load_tuning():
+    """Load the remembered --encode-jobs auto settings."""
+    tuning_path = os.path.join(get_application_path(), TUNING_FILE)
+    if os.path.exists(tuning_path):
+        try:
+            with open(tuning_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading tuning file: {str(e)}")
+    return {}
+
+def get_remembered_jobs(input_class):
+    """Get the job count auto-tuning settled on last time for this host and input class."""
+    return load_tuning().get(f"{platform.node()}/{input_class}", {}).get('jobs', 1)
+
+def new_encode_tuner(input_class, max_jobs=None):
+    """Create the state shared by tuned encodes and the tuning task."""
+    cpu_count = get_usable_cpu_count()
+    max_jobs = max(1, min(max_jobs or cpu_count, cpu_count))
+    return {
+        'input_class': input_class,
+        'cpu_count': cpu_count,
+        'max_jobs': max_jobs,
+        'limit': min(get_remembered_jobs(input_class), max_jobs),
+        'active': 0,
+        'frames': 0,
+        'direction': 1,
+        'last_fps': None,
+        'history': {},  # jobs -> measured fps
+        'cond': asyncio.Condition(),
+    }
+
+async def tuner_acquire(tuner):
+    """Wait for a free encode slot. Returns the ffmpeg thread count for the new job."""
+    async with tuner['cond']:
+        await tuner['cond'].wait_for(lambda: tuner['active'] < tuner['limit'])
+        tuner['active'] += 1
+        return max(1, tuner['cpu_count'] // tuner['limit'])
+
+async def tuner_release(tuner):
+    """Give an encode slot back."""
+    async with tuner['cond']:
+        tuner['active'] -= 1
+        tuner['cond'].notify_all()
+
+def tuner_add_frames(tuner, frames):
+    """Count frames reported by ffmpeg progress."""
+    tuner['frames'] += frames
+
+def tune_step(tuner, fps, load=None):
+    """Move the job limit one step, hill-climbing on aggregate encode fps."""
+    limit = tuner['limit']
+    tuner['history'][limit] = fps
+
+    # Throughput dropped since the last step: turn around
+    if tuner['last_fps'] is not None and fps < tuner['last_fps'] * 0.95:
+        tuner['direction'] = -tuner['direction']
+    # Host is already oversubscribed, more jobs won't help
+    if load is not None and load > AUTO_TUNE_MAX_LOAD and tuner['direction'] > 0:
+        tuner['direction'] = -1
+
+    new_limit = min(max(limit + tuner['direction'], 1), tuner['max_jobs'])
+    if new_limit == limit:
+        tuner['direction'] = -tuner['direction']
+    tuner['last_fps'] = fps
+    tuner['limit'] = new_limit
+    return new_limit
+
+async def run_encode_tuner(tuner, window=AUTO_TUNE_WINDOW):
+    """Sample encode throughput every window seconds and adjust the job limit. Runs until cancelled."""
+    last_sample = time.time()
+    while True:
+        await asyncio.sleep(window)
+        now = time.time()
+        fps = tuner['frames'] / (now - last_sample)
+        tuner['frames'] = 0
+        last_sample = now
+        # Only a full set of slots says something about the current limit
+        if tuner['active'] < tuner['limit']:
+            continue
+        load = os.getloadavg()[0] / tuner['cpu_count'] if hasattr(os, 'getloadavg') else None
+        limit = tuner['limit']
+        new_limit = tune_step(tuner, fps, load)
+        if new_limit != limit:
+            print(f"Auto-tune: {fps:.1f} fps with {limit} jobs, switching to {new_limit} jobs")
+            async with tuner['cond']:
+                tuner['cond'].notify_all()
+
+def save_tuning(tuner):
+    """Remember the best measured job count for this host and input class."""
+    if not tuner['history']:
+        return False
+    best_jobs = max(tuner['history'], key=tuner['history'].get)
+    tuning = load_tuning()
+    tuning[f"{platform.node()}/{tuner['input_class']}"] = {
+        'jobs': best_jobs,
+        'fps': round(tuner['history'][best_jobs], 1),
+        'updated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    try:
+        with open(os.path.join(get_application_path(), TUNING_FILE), 'w') as f:
+            json.dump(tuning, f, indent=4)
+        print(f"Auto-tune: settled on {best_jobs} parallel jobs for {tuner['input_class']}")
+        return True
+    except Exception as e:
+        print(f"Error saving tuning file: {str(e)}")
+        return False
+
+async def tuned_reencode_video(tuner, input_path, output_path, target_codec, target_fps, profile=None,
+                               timeout=None):
+    """Re-encode a video inside an auto-tuned encode slot."""
+    threads = await tuner_acquire(tuner)
+    try:
+        return await reencode_video(input_path, output_path, target_codec, target_fps, profile,
+                                    progress_cb=lambda frames: tuner_add_frames(tuner, frames),
+                                    threads=threads, timeout=timeout)
+    finally:
+        await tuner_release(tuner)
+
+def new_run_report(mode, profile):
+    """Start a run report for the --report option."""
+    return {
+        'mode': mode,
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'profile': profile,
+        'governor': dict(GOVERNOR),
+        'target': None,
+        'encoder_args': None,
+        'files': [],
+        'outputs': [],
+        'success': False,
+        'verify': None,
+    }
+
+def add_report_file(report, info, action, output_path=None):
+    """Record what happened to one input in the run report."""
+    report['files'].append({
+        'path': info['path'],
+        'codec': info['signature'].codec,
+        'fps': format_fps(info['signature'].fps),
+        'action': action,
+        'output': output_path or info['path'],
+    })
+
+def write_run_report(report, report_path):
+    """Write the run report as JSON if a report path was given."""
+    if not report_path:
+        return False
+    report['finished'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    try:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Run report written to {report_path}")
+        return True
+    except Exception as e:
+        print(f"Error writing run report: {str(e)}")
+        return False
+
+def get_watch_work_dir(watch_dir):
+    """Get the directory where watch mode keeps its prepared pieces."""
+    return os.path.join(os.path.abspath(watch_dir), WATCH_WORK_DIR)
+
+def seal_watch_dir(watch_dir):
+    """Ask the watcher running on watch_dir to stop and concatenate."""
+    work_dir = get_watch_work_dir(watch_dir)
+    if not os.path.isdir(work_dir):
+        print(f"No watcher is running on {watch_dir}.")
+        return False
+    with open(os.path.join(work_dir, WATCH_SEAL_FILE), 'w') as f:
+        f.write(str(time.time()))
+    print(f"Sealed {watch_dir}. The watcher will concatenate the prepared pieces now.")
+    return True
+
+def scan_watch_dir(watch_dir, exclude=None):
+    """Return {path: (size, mtime)} for the video files directly inside watch_dir, minus `exclude` paths."""
+    found = {}
+    with os.scandir(watch_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                continue
+            path = os.path.abspath(entry.path)
+            if exclude and path in exclude:
+                continue
+            stat = entry.stat()
+            found[path] = (stat.st_size, stat.st_mtime)
+    return found
+
+async def prepare_watch_piece(info, target_codec, target_fps, work_dir, state):
+    """Re-encode one outlier in the background for the given target format.
+    
+    A clip find_retimes accepts needs no piece, its own path is returned.
+    """
+    if await find_retimes([info], target_codec, target_fps, state.get('retime_tolerance', 0),
+                          timeout=state.get('probe_timeout', PROBE_TIMEOUT)):
+        return info['path']
+    async with state['slot']:
+        if state['target'] != (target_codec, target_fps):
+            # The common format moved on before this job got its turn
+            return None
+
+        profile = state.get('profile') or resolve_encoder_profile()
+        target_dir = os.path.join(work_dir, f"{target_codec}_{format_fps(target_fps)}_{profile['name']}")
+        os.makedirs(target_dir, exist_ok=True)
+        piece_path = get_temp_filename(info['path'], target_dir)
+
+        # Reuse pieces left by an earlier watcher on the same folder
+        if os.path.exists(piece_path) and os.path.getmtime(piece_path) >= os.path.getmtime(info['path']):
+            return piece_path
+
+        # Encode under a different name so an interrupted job never looks finished
+        partial_path = os.path.join(target_dir, "partial_" + os.path.basename(piece_path))
+        if await reencode_video(info['path'], partial_path, target_codec, target_fps, profile,
+                                timeout=state.get('job_timeout')):
+            os.replace(partial_path, piece_path)
+            return piece_path
+        return None
+
+async def watch_folder(watch_dir, outputs, prefer_h264=False, no_encode=False, interval=2.0,
+                       profile=None, report_path=None, verify=False, retime_tolerance=0,
+                       job_timeout=None, probe_timeout=PROBE_TIMEOUT):
+    """Watch a capture folder, probing and pre-encoding clips as they land.
+
+    A clip is probed once its size and mtime stay the same between two polls.
+    Clips that don't match the running most common format are re-encoded in
+    the background, so sealing the folder only has to concatenate.
+    job_timeout limits each re-encode and the final concat, probe_timeout
+    each probe.
+    """
+    watch_dir = os.path.abspath(watch_dir)
+    if not os.path.isdir(watch_dir):
+        print(f"Watch folder not found: {watch_dir}")
+        return False
+
+    work_dir = get_watch_work_dir(watch_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    seal_path = os.path.join(work_dir, WATCH_SEAL_FILE)
+    cleanup_temp_files(seal_path)  # Stale seal from a previous session
+    output_paths = {os.path.abspath(path) for path in get_output_paths(outputs)}
+
+    profile = profile or resolve_encoder_profile()
+    # A folder full of clips is probed PROBE_JOBS at a time, like probe_videos
+    probe_slots = asyncio.Semaphore(PROBE_JOBS)
+
+    async def probe(path):
+        async with probe_slots:
+            return await get_video_info(path, probe_timeout)
+
+    def vote(infos):
+        """The common format of infos, keeping the running target's exact rate while it is the same format."""
+        target = find_most_common_format(infos, prefer_h264)
+        running = state['target']
+        if running[0] == target[0] and running[1] is not None and format_fps(running[1]) == format_fps(target[1]):
+            return running
+        return target
+
+    # One background encode at a time, the capture host is still busy recording
+    state = {'slot': asyncio.Semaphore(1), 'target': (None, None), 'profile': profile,
+             'retime_tolerance': retime_tolerance, 'job_timeout': job_timeout, 'probe_timeout': probe_timeout}
+    report = new_run_report('watch', profile)
+    last_seen = {}    # path -> (size, mtime) from the previous poll
+    video_infos = {}  # path -> probe info
+    pieces = {}       # (path, codec, fps) -> Task preparing the piece
+
+    print(f"\nWatching {watch_dir} (poll every {interval}s)...")
+    print(f"Run 'vconcat --watch \"{watch_dir}\" --seal' when the capture is done.")
+
+    try:
+        while True:
+            sealed = os.path.exists(seal_path)
+            snapshot = scan_watch_dir(watch_dir, exclude=output_paths)
+
+            # After the seal nothing is being written anymore
+            ready = [path for path in sorted(snapshot)
+                     if path not in video_infos and (sealed or last_seen.get(path) == snapshot[path])]
+            for path, info in zip(ready, await asyncio.gather(*(probe(path) for path in ready))):
+                video_infos[path] = info
+                if info:
+                    info['path'] = path
+                    print(f"Analyzed {os.path.basename(path)}: Codec: {info['signature'].codec}, FPS: {format_fps(info['signature'].fps)}")
+                else:
+                    print(f"  - Failed to analyze {path}")
+            last_seen = snapshot
+
+            if ready and not no_encode and any(video_infos.values()):
+                target = vote([i for i in video_infos.values() if i])
+                if target != state['target']:
+                    print(f"Running common format: Codec={target[0]}, FPS={format_fps(target[1])}")
+                state['target'] = target
+                for info in video_infos.values():
+                    if not info or matches_target_format(info, *target):
+                        continue
+                    key = (info['path'],) + target
+                    if key not in pieces:
+                        pieces[key] = asyncio.create_task(
+                            prepare_watch_piece(info, target[0], target[1], work_dir, state))
+
+            if sealed:
+                break
+            await asyncio.sleep(interval)
+    except asyncio.CancelledError:
+        print(f"\nWatch interrupted. Prepared pieces are kept in {work_dir}")
+        for task in pieces.values():
+            task.cancel()
+        await asyncio.gather(*pieces.values(), return_exceptions=True)
+        raise
+
+    infos = [video_infos[path] for path in sorted(video_infos) if video_infos[path]]
+    if not infos:
+        print("No valid video files to process.")
+        return False
+
+    # Sealed: collect the prepared pieces and encode whatever is still missing
+    final_file_list = []
+    joined_infos = []
+    if no_encode:
+        final_file_list = [info['path'] for info in infos]
+        joined_infos = infos
+        for info in infos:
+            add_report_file(report, info, 'copy')
+    else:
+        target = vote(infos)
+        state['target'] = target
+        # Pieces for a format that lost the vote are not needed anymore
+        for key, task in pieces.items():
+            if key[1:] != target:
+                task.cancel()
+        report['target'] = {'codec': target[0], 'fps': format_fps(target[1])}
+        report['encoder_args'] = get_encoder_args(target[0], profile)
+        print(f"\nSealed. Final common format: Codec={target[0]}, FPS={format_fps(target[1])}")
+        for info in infos:
+            if matches_target_format(info, *target):
+                final_file_list.append(info['path'])
+                joined_infos.append(info)
+                add_report_file(report, info, 'copy')
+                continue
+            task = pieces.get((info['path'],) + target)
+            piece_path = None
+            if task:
+                try:
+                    piece_path = await task
+                except Exception as e:
+                    print(f"Background job for {os.path.basename(info['path'])} failed: {str(e)}")
+            if not piece_path:
+                try:
+                    piece_path = await prepare_watch_piece(info, target[0], target[1], work_dir, state)
+                except Exception as e:
+                    print(f"Error preparing {os.path.basename(info['path'])}: {str(e)}")
+            if piece_path == info['path']:
+                final_file_list.append(piece_path)
+                joined_infos.append(info)
+                add_report_file(report, info, 'retime')
+            elif piece_path:
+                final_file_list.append(piece_path)
+                joined_infos.append(await get_piece_info(info, piece_path, probe_timeout))
+                add_report_file(report, info, 'reencode', piece_path)
+            else:
+                print(f"Skipping {os.path.basename(info['path'])} due to re-encoding failure.")
+                add_report_file(report, info, 'failed')
+        await asyncio.gather(*pieces.values(), return_exceptions=True)
+
+    report['outputs'] = get_output_paths(outputs)
+    if final_file_list and await concatenate_videos(final_file_list, outputs, job_timeout):
+        print(f"\nSuccess! Concatenated video saved to: {', '.join(report['outputs'])}")
+        shutil.rmtree(work_dir, ignore_errors=True)
+        report['success'] = True
+        if verify:
+            await verify_outputs(outputs, joined_infos, report, job_timeout)
+    else:
+        print(f"\nFailed to concatenate videos. Prepared pieces are kept in {work_dir}")
+    write_run_report(report, report_path)
+    return report['success']
+
+async def get_piece_info(info, piece_path, timeout=PROBE_TIMEOUT):
+    """The info of a video as its re-encoded piece goes into the concat.
+    
+    The piece's own probed duration replaces the source's, verification and
+    early deletion count on it. The source info is kept if the piece can't
+    be probed.
+    """
+    piece_info = await get_video_info(piece_path, timeout)
+    if not piece_info or not piece_info['duration']:
+        return info
+    return dict(info, duration=piece_info['duration'])
+
+def get_scratch_size(info):
+    """Bytes reserved on a scratch folder for the intermediate of one video."""
+    return int(estimate_intermediate_size(info) * SCRATCH_SIZE_MARGIN)
+
+def plan_scratch(video_infos, scratch_dirs, policy=DEFAULT_SCRATCH_POLICY):
+    """Place the intermediates of video_infos on the scratch folders, within their free space.
+    
+    round-robin spreads the files over the folders in turn, free-space puts
+    each file, largest first, on the folder with the most room left. A folder
+    without room for a file is passed over for the next one, folders on the
+    same volume share its free space. Returns {path: scratch folder}, or None
+    if the files don't fit.
+    """
+    devices = {}
+    budgets = {}  # device -> bytes still free
+    for scratch_dir in scratch_dirs:
+        try:
+            os.makedirs(scratch_dir, exist_ok=True)
+            devices[scratch_dir] = os.stat(scratch_dir).st_dev
+            budgets.setdefault(devices[scratch_dir], shutil.disk_usage(scratch_dir).free - SCRATCH_RESERVE)
+        except OSError as e:
+            print(f"Scratch folder {scratch_dir} is not usable: {str(e)}")
+    usable = [scratch_dir for scratch_dir in scratch_dirs if scratch_dir in devices]
+    if not usable:
+        return None
+    
+    if policy == 'free-space':
+        video_infos = sorted(video_infos, key=get_scratch_size, reverse=True)
+    placement = {}
+    turn = 0
+    for info in video_infos:
+        size = get_scratch_size(info)
+        if policy == 'round-robin':
+            candidates = usable[turn:] + usable[:turn]
+            turn = (turn + 1) % len(usable)
+        else:
+            candidates = sorted(usable, key=lambda scratch_dir: budgets[devices[scratch_dir]], reverse=True)
+        target = next((d for d in candidates if budgets[devices[d]] >= size), None)
+        if target is None:
+            needed = sum(get_scratch_size(i) for i in video_infos)
+            free = sum(max(budget, 0) for budget in budgets.values())
+            print(f"Not enough scratch space: about {needed / 2**30:.1f} GB of intermediates, "
+                  f"{free / 2**30:.1f} GB free in {', '.join(usable)}")
+            return None
+        budgets[devices[target]] -= size
+        placement[info['path']] = target
+    return placement
+
+async def encode_and_concatenate(video_infos, target_codec, target_fps, outputs, profile,
+                                 encode_jobs=1, report=None, job_timeout=None, verify=False,
+                                 scratch_dirs=None, scratch_policy=DEFAULT_SCRATCH_POLICY,
+                                 retime_tolerance=0):
+    """Re-encode the videos that don't match the target format, then concatenate everything.
+    
+    Videos whose measured cadence is within retime_tolerance percent of the
+    target are retimed, joined as they are. Re-encoded files are placed on
+    the scratch folders (the system temp folder by default) after checking
+    they fit. They are deleted as soon as the
+    concat is past them, and their folders are removed however this ends,
+    including cancellation; running ffmpeg children are stopped first.
+    """
+    report = report if report is not None else new_run_report('concat', profile)
+    retimes = await find_retimes(video_infos, target_codec, target_fps, retime_tolerance)
+    outliers = [info for info in video_infos
+                if not matches_target_format(info, target_codec, target_fps) and info['path'] not in retimes]
+    
+    # Preflight: refuse before encoding anything if the intermediates can't fit
+    placement = plan_scratch(outliers, scratch_dirs or [tempfile.gettempdir()], scratch_policy)
+    if placement is None:
+        print("\nNot starting: re-encoded files would not fit in the scratch space. "
+              "Add folders with --scratch-dir or free some space.")
+        return False
+    if scratch_dirs and outliers:
+        for scratch_dir in scratch_dirs:
+            count = sum(1 for d in placement.values() if d == scratch_dir)
+            if count:
+                print(f"Scratch: {count} file(s) in {scratch_dir}")
+    
+    work_dirs = {}
+    try:
+        for scratch_dir in set(placement.values()):
+            work_dirs[scratch_dir] = tempfile.mkdtemp(prefix="vconcat_", dir=scratch_dir)
+        tuner = None
+        tuning_task = None
+        if encode_jobs == 'auto' and outliers:
+            # Encodes wait on the tuner for a slot, the tuning task moves the limit
+            tuner = new_encode_tuner(get_input_class(outliers, target_codec, profile), len(outliers))
+            tuning_task = asyncio.create_task(run_encode_tuner(tuner))
+            print(f"Auto-tune: starting with {tuner['limit']} parallel jobs")
+        slots = asyncio.Semaphore(1 if encode_jobs == 'auto' else encode_jobs)
+        piece_infos = {}  # path -> info of its re-encoded piece
+        
+        async def encode(info, temp_output):
+            """Re-encode one video to the target format, returning whether it worked."""
+            if tuner:
+                done = await tuned_reencode_video(tuner, info['path'], temp_output, target_codec, target_fps,
+                                                  profile, job_timeout)
+            else:
+                async with slots:
+                    done = await reencode_video(info['path'], temp_output, target_codec, target_fps, profile,
+                                                timeout=job_timeout)
+            if done:
+                piece_infos[info['path']] = await get_piece_info(info, temp_output)
+            return done
+        
+        # Re-encode the videos that don't match, up to encode_jobs at a time
+        encodes = {}
+        for info in outliers:
+            print(f"{os.path.basename(info['path'])} needs re-encoding:")
+            print(f"  - Current: Codec={info['signature'].codec}, FPS={format_fps(info['signature'].fps)}")
+            print(f"  - Target: Codec={target_codec}, FPS={format_fps(target_fps)}")
+            temp_output = get_temp_filename(info['path'], work_dirs[placement[info['path']]])
+            encodes[info['path']] = (temp_output, asyncio.create_task(encode(info, temp_output)))
+        
+        try:
+            await asyncio.gather(*(task for _, task in encodes.values()))
+        finally:
+            # On cancellation make sure every child is gone before the temp dir is removed
+            for _, task in encodes.values():
+                task.cancel()
+            await asyncio.gather(*(task for _, task in encodes.values()), return_exceptions=True)
+            if tuning_task:
+                tuning_task.cancel()
+                await asyncio.gather(tuning_task, return_exceptions=True)
+        if tuner:
+            save_tuning(tuner)
+        
+        # Process each video in the original order
+        final_file_list = []
+        joined_infos = []
+        for info in video_infos:
+            if info['path'] in retimes:
+                print(f"{os.path.basename(info['path'])} plays at the target cadence, joined as it is "
+                      f"(FPS={format_fps(info['signature'].fps)}).")
+                final_file_list.append(info['path'])
+                joined_infos.append(info)
+                add_report_file(report, info, 'retime')
+                continue
+            if info['path'] not in encodes:
+                # No need to re-encode
+                print(f"{os.path.basename(info['path'])} already matches target format.")
+                final_file_list.append(info['path'])
+                joined_infos.append(info)
+                add_report_file(report, info, 'copy')
+                continue
+            temp_output, task = encodes[info['path']]
+            if task.result():
+                final_file_list.append(temp_output)
+                joined_infos.append(piece_infos[info['path']])
+                add_report_file(report, info, 'reencode', temp_output)
+            else:
+                print(f"Skipping {os.path.basename(info['path'])} due to re-encoding failure.")
+                add_report_file(report, info, 'failed')
+        
+        # Intermediates can go once the concat has read past their last use
+        last_use = {}
+        offset = 0.0
+        for info, path in zip(joined_infos, final_file_list):
+            offset += info.get('duration', 0)
+            if path != info['path']:
+                last_use[path] = offset
+        disposable = [(end, path) for path, end in last_use.items()]
+        
+        # Concatenate all videos
+        if not final_file_list:
+            print("\nNo videos to concatenate after processing.")
+        elif await concatenate_videos(final_file_list, outputs, job_timeout, disposable):
+            print(f"\nSuccess! Concatenated video saved to: {', '.join(get_output_paths(outputs))}")
+            report['success'] = True
+            if verify:
+                await verify_outputs(outputs, joined_infos, report, job_timeout)
+        else:
+            print("\nFailed to concatenate videos.")
+    finally:
+        for work_dir in work_dirs.values():
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return report['success']
+
+def natural_sort_key(name):
+    """Sort key that puts clip2 before clip10."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+def matches_globs(rel_path, patterns):
+    """Whether a path relative to the scanned folder, or its file name, matches one of the patterns."""
+    name = rel_path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def scan_input_dir(root, include=None, exclude=None, sort=DEFAULT_INPUT_SORT):
+    """Yield the video files below root, recursively, as they are found.
+    
+    Without include patterns every file with a video extension is taken.
+    Exclude patterns also prune whole folders. natural and name order sort
+    each folder on its own while walking, mtime sorts the whole tree first.
+    Watch mode work folders and links to folders are skipped, so a link
+    back to a parent cannot loop.
+    """
+    def walk(path, rel_dir):
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError as e:
+            print(f"Cannot read folder {path}: {str(e)}")
+            return
+        if sort == 'natural':
+            entries.sort(key=lambda entry: natural_sort_key(entry.name))
+        elif sort in ('name', 'mtime'):
+            entries.sort(key=lambda entry: entry.name)
+        for entry in entries:
+            rel_path = f"{rel_dir}{entry.name}"
+            if exclude and matches_globs(rel_path, exclude):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != WATCH_WORK_DIR:
+                        yield from walk(entry.path, rel_path + '/')
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if include:
+                if not matches_globs(rel_path, include):
+                    continue
+            elif not entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                continue
+            yield entry
+    
+    if sort == 'mtime':
+        entries = []
+        for entry in walk(root, ''):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                continue
+        entries.sort()
+        for _, path in entries:
+            yield os.path.abspath(path)
+    else:
+        for entry in walk(root, ''):
+            yield os.path.abspath(entry.path)
+
+def read_input_list(list_path):
+    """Yield the paths of a list file, one per line; '-' reads stdin.
+    
+    Blank lines and lines starting with # are skipped, relative paths are
+    relative to the list file.
+    """
+    if list_path == '-':
+        lines, base_dir = sys.stdin, os.getcwd()
+    else:
+        lines, base_dir = open(list_path, 'r', encoding='utf-8'), os.path.dirname(os.path.abspath(list_path))
+    try:
+        for line in lines:
+            path = line.strip().strip('"\'')
+            if path and not path.startswith('#'):
+                yield os.path.abspath(os.path.join(base_dir, path))
+    finally:
+        # stdin stays open, it is not ours to close
+        if lines is not sys.stdin:
+            lines.close()
+
+def discover_input_files(input_files, dirs=None, lists=None, include=None, exclude=None,
+                         sort=DEFAULT_INPUT_SORT, output_paths=None):
+    """Chain the given files, the videos found in dirs and the paths of the list files into one stream.
+    
+    Found files at one of output_paths are left out, the output of an
+    earlier run in the same folder must not become an input.
+    """
+    skip = {os.path.abspath(path) for path in output_paths or []}
+    
+    def without_outputs(paths):
+        for path in paths:
+            if os.path.abspath(path) in skip:
+                print(f"Skipping {path}: it is an output of this run.")
+                continue
+            yield path
+    
+    yield from input_files
+    for root in dirs or []:
+        if not os.path.isdir(root):
+            print(f"Folder not found: {root}")
+            continue
+        yield from without_outputs(scan_input_dir(root, include, exclude, sort))
+    for list_path in lists or []:
+        try:
+            yield from without_outputs(read_input_list(list_path))
+        except OSError as e:
+            print(f"Cannot read input list {list_path}: {str(e)}")
+
 def get_input_files_interactive():
     """Get input files interactively from user."""
     input_files = []
@@ -452,27 +2214,63 @@ def parse_arguments():
     """Parse command line arguments."""
     parser = get_main_parser()
     parser.add_argument("input_files", nargs="*", help="Input video files to concatenate").complete = shtab.FILE
-    parser.add_argument("-o", "--output", help="Output file path (default: output.mp4)")
+    parser.add_argument("-o", "--output", action="append", type=parse_output_spec, metavar="PATH[?OPTIONS]",
+                        help="Output file path (default: output.mp4). Repeat for more renditions from the same run, "
+                             "e.g. -o master.mp4 -o \"preview.mp4?codec=h264&profile=fast&height=360\". Use - to stream to stdout")
+    parser.add_argument("--output-format", choices=list(OUTPUT_FORMATS), help="Streamable container for the outputs: fmp4 or mpegts (default for -o -: fmp4)")
+    parser.add_argument("--from-dir", action="append", metavar="DIR", help="Add every video below DIR, recursively (repeatable)").complete = shtab.DIRECTORY
+    parser.add_argument("--from-list", action="append", metavar="FILE", help="Add the paths listed in FILE, one per line, - for stdin (repeatable)").complete = shtab.FILE
+    parser.add_argument("--include", action="append", metavar="GLOB", help="With --from-dir: only take files matching GLOB instead of known video extensions (repeatable)")
+    parser.add_argument("--exclude", action="append", metavar="GLOB", help="With --from-dir: skip files and folders matching GLOB (repeatable)")
+    parser.add_argument("--sort", choices=INPUT_SORTS, help="Order of --from-dir files: natural, name, mtime or none (default: natural)")
     parser.add_argument("-i", "--interactive", action="store_true", help="Use interactive mode even if files are provided")
     parser.add_argument("--prefer-h264", "-ph4", action="store_true", help="Prefer H.264 codec with 29.97 fps when most common format is different")
     parser.add_argument("--no-encode", action="store_true", help="Disable re-encoding completely, just concatenate files as they are")
+    parser.add_argument("--watch", metavar="DIR", help="Watch a folder, probing and pre-encoding clips as they are written").complete = shtab.DIRECTORY
+    parser.add_argument("--seal", action="store_true", help="With --watch: tell the running watcher to concatenate and exit")
+    parser.add_argument("--watch-interval", type=float, metavar="SECONDS", help="Polling interval for --watch (default: 2)")
+    parser.add_argument("--profile", "-p", metavar="NAME", help="Encoder speed/quality profile: fast, balanced, archive or one from vconcat.conf (default: balanced)")
+    parser.add_argument("--report", metavar="FILE", help="Write a JSON run report to FILE").complete = shtab.FILE
+    parser.add_argument("--encode-jobs", "-j", type=parse_encode_jobs, metavar="N|auto", help="Number of videos re-encoded in parallel, or 'auto' to tune it while encoding (default: 1)")
+    parser.add_argument("--plan", action="store_true", help="Probe and plan only, write the JSON plan to stdout without encoding")
+    parser.add_argument("--plan-file", metavar="FILE", help="Like --plan, but write the JSON plan to FILE").complete = shtab.FILE
+    parser.add_argument("--calibrate", action="store_true", help="Measure this host's encoder speeds for --plan and exit")
+    parser.add_argument("--governor", "-g", metavar="NAME", help="Resource governor profile for ffmpeg children: off, polite, background or one from vconcat.conf (default: off)")
+    parser.add_argument("--nice", type=parse_nice_level, metavar="N", help="Override the governor's nice level (0-19)")
+    parser.add_argument("--cpus", metavar="LIST", help="Override the governor's CPU affinity, e.g. 0-3,6")
+    parser.add_argument("--memory-limit", type=int, metavar="MB", help="Override the governor's address-space limit per child")
+    parser.add_argument("--job-timeout", type=float, metavar="SECONDS", help="Give up on a single re-encode or the final concat after SECONDS")
+    parser.add_argument("--scratch-dir", action="append", metavar="DIR", help="Folder for re-encoded intermediates, repeat to use several (default: system temp folder)").complete = shtab.DIRECTORY
+    parser.add_argument("--scratch-policy", choices=SCRATCH_POLICIES, help="How intermediates are spread over --scratch-dir folders: free-space or round-robin (default: free-space)")
+    parser.add_argument("--retime-tolerance", type=float, metavar="PERCENT", help=f"Retime instead of re-encoding clips in the target codec whose measured frame rate is within PERCENT of the target, 0 to disable (default: {DEFAULT_RETIME_TOLERANCE})")
+    parser.add_argument("--verify", action="store_true", help="Check the outputs after concatenation from packet timestamps, without decoding")
+    parser.add_argument("--governor-bench", action="store_true", help="Measure the encode throughput cost of each governor profile and exit")
     return parser.parse_args()
 
 def main():
     """Main function to run the video concatenation tool."""
     
+    # Parse command line arguments
+    args = parse_arguments()
+    
+    # A plan or a streamed output on stdout must be the only thing written there
+    streaming = any(r['path'] == STDOUT_OUTPUT for r in args.output or [])
+    plan_to_stdout = args.plan and not args.plan_file
+    data_out = redirect_messages_to_stderr() if plan_to_stdout or streaming else None
+    # Once stdin has supplied the input list there is nobody left to answer a prompt
+    stdin_list = '-' in (args.from_list or [])
+    prompts = not data_out and not stdin_list
+    
     print_banner()
     
     if not ensure_ffmpeg():
-        input("Press Enter to exit...")
+        if prompts:
+            input("Press Enter to exit...")
         return
     
     # Load configuration from file
     config = load_config()
     
-    # Parse command line arguments
-    args = parse_arguments()
-    
     # Check if no-encode is enabled (command line takes precedence over config)
     no_encode = args.no_encode or config.get('no_encode', False)
     
@@ -480,10 +2278,60 @@ def main():
     # Command line arguments take precedence over config file
     # If no-encode is enabled, prefer_h264 is disabled
     prefer_h264 = False if no_encode else (args.prefer_h264 or config.get('prefer_h264', False))
+    profile = resolve_encoder_profile(args.profile, config)
+    report_path = args.report or config.get('report')
+    encode_jobs = parse_encode_jobs(args.encode_jobs or config.get('encode_jobs', 1))
+    job_timeout = args.job_timeout or config.get('job_timeout')
+    probe_timeout = config.get('probe_timeout', PROBE_TIMEOUT)
+    if args.plan_file and (args.plan_file.lower().endswith(VIDEO_EXTENSIONS) or
+                           os.path.abspath(args.plan_file) in {os.path.abspath(path) for path in args.input_files}):
+        print(f"Refusing to write the plan to {args.plan_file}: it looks like a video or is an input file.")
+        return
+    verify = args.verify or config.get('verify', False)
+    retime_tolerance = args.retime_tolerance if args.retime_tolerance is not None else \
+        config.get('retime_tolerance', DEFAULT_RETIME_TOLERANCE)
+    scratch_dirs = args.scratch_dir or config.get('scratch_dirs')
+    scratch_policy = args.scratch_policy or config.get('scratch_policy', DEFAULT_SCRATCH_POLICY)
+    if scratch_policy not in SCRATCH_POLICIES:
+        print(f"Unknown scratch policy '{scratch_policy}', expected one of: {', '.join(SCRATCH_POLICIES)}")
+        return
+    output_format = args.output_format or config.get('output_format')
+    if output_format and output_format not in OUTPUT_FORMATS:
+        print(f"Unknown output format '{output_format}', expected one of: {', '.join(OUTPUT_FORMATS)}")
+        return
+    if len([r for r in args.output or [] if r['path'] == STDOUT_OUTPUT]) > 1:
+        print("Only one output can be streamed to stdout.")
+        return
+    
+    set_governor(resolve_governor(args.governor, config,
+                                  {'nice': args.nice, 'cpus': args.cpus, 'memory_mb': args.memory_limit}))
+    if GOVERNOR['settings']:
+        print(f"Governor: {GOVERNOR['name']} {GOVERNOR['settings']}")
+    
+    if args.governor_bench:
+        benchmark_governors(profile, config)
+        return
+    
+    if args.calibrate:
+        calibrate_encoder_speeds(profile, (os.cpu_count() or 1) if encode_jobs == 'auto' else encode_jobs)
+        return
+    
+    # Watch mode works on a folder instead of a list of files
+    if args.watch:
+        if args.seal:
+            seal_watch_dir(args.watch)
+            return
+        interval = args.watch_interval or config.get('watch_interval', 2.0)
+        outputs = resolve_renditions(args.output or [parse_output_spec("output.mp4")], profile, config,
+                                     output_format)
+        run_async(watch_folder(args.watch, outputs, prefer_h264, no_encode, interval,
+                               profile, report_path, verify, retime_tolerance, job_timeout, probe_timeout))
+        return
     
     # Get input files
     input_files = []
-    if args.input_files and not args.interactive:
+    discovered = args.from_dir or args.from_list
+    if (args.input_files or discovered) and not args.interactive:
         # Use files provided as command line arguments
         for file_path in args.input_files:
             if os.path.exists(file_path):
@@ -494,62 +2342,88 @@ def main():
         # Get files interactively
         input_files = get_input_files_interactive()
     
-    if not input_files:
+    if not input_files and not discovered:
         print("No valid input files provided. Exiting.")
-        input("Press Enter to exit...")
+        if prompts:
+            input("Press Enter to exit...")
         return
     
     # Get output file path
     if args.output and not args.interactive:
-        output_file = args.output
+        outputs = args.output
     else:
-        output_file = get_output_file_interactive()
+        outputs = [parse_output_spec(get_output_file_interactive())]
+    outputs = resolve_renditions(outputs, profile, config, output_format)
+    
+    if discovered:
+        # Folders and lists are walked while the first files are already being probed
+        input_sort = args.sort or config.get('input_sort', DEFAULT_INPUT_SORT)
+        if input_sort not in INPUT_SORTS:
+            print(f"Unknown input sort '{input_sort}', expected one of: {', '.join(INPUT_SORTS)}")
+            return
+        input_files = discover_input_files(input_files, args.from_dir, args.from_list,
+                                           args.include or config.get('include'),
+                                           args.exclude or config.get('exclude'), input_sort,
+                                           [r['path'] for r in outputs if not is_stdout_output(r)])
     
     # Analyze all videos
     print("\nAnalyzing video files...")
-    video_infos = []
-    for file_path in input_files:
-        print(f"Analyzing {os.path.basename(file_path)}...")
-        info = get_video_info(file_path)
-        if info:
-            info['path'] = file_path
-            video_infos.append(info)
-            print(f"  - Codec: {info['codec']}, FPS: {info['fps']}")
-        else:
-            print(f"  - Failed to analyze {file_path}")
+    video_infos = run_async(probe_videos(input_files, timeout=probe_timeout))
     
     if not video_infos:
         print("No valid video files to process. Exiting.")
-        input("Press Enter to exit...")
+        if prompts:
+            input("Press Enter to exit...")
         return
     
-    # Count format keys
-    format_keys = Counter([info['format_key'] for info in video_infos if info])
-    
-    # Find most common format (even if we're not re-encoding, we need to know the target format)
-    most_common_format = format_keys.most_common(1)[0][0]
-    target_codec, target_fps_str = most_common_format.split('_')
-    target_fps = float(target_fps_str)
+    # Dry run: describe the work and stop before encoding anything
+    if args.plan or args.plan_file:
+        target_codec, target_fps = find_most_common_format(video_infos, prefer_h264)
+        retimes = set() if no_encode else run_async(find_retimes(video_infos, target_codec, target_fps,
+                                                                  retime_tolerance))
+        plan_jobs = encode_jobs
+        if encode_jobs == 'auto':
+            outliers = [info for info in video_infos
+                        if not matches_target_format(info, target_codec, target_fps) and info['path'] not in retimes]
+            plan_jobs = get_remembered_jobs(get_input_class(outliers, target_codec, profile))
+        plan = build_plan(video_infos, target_codec, target_fps, outputs, profile, plan_jobs, no_encode,
+                          retimes=retimes)
+        if plan_to_stdout:
+            json.dump(plan, data_out, indent=4)
+            data_out.write("\n")
+        else:
+            with open(args.plan_file, 'w') as f:
+                json.dump(plan, f, indent=4)
+            print(f"Plan written to {args.plan_file}")
+        return
     
     # Check if no-encode is enabled and there are different formats
     if no_encode:
-        if len(format_keys) > 1:
-            if platform.system() == "Windows":
+        # Find most common format (even if we're not re-encoding, we need to know the target format)
+        formats = count_formats(video_infos)
+        target_codec, target_fps = find_most_common_format(video_infos)
+        if len(formats) > 1:
+            if data_out:
+                pass  # Clearing the screen would write into the stream
+            elif platform.system() == "Windows":
                 os.system('cls')
             else:
                 os.system('clear')
             print("\nWARNING: Multiple video formats detected but --no-encode is enabled.\n")
             print(f"\033[34m============== Most common format =============\033[0m")
             print(f" - Codec= \033[32m{target_codec}\033[0m")
-            print(f" - FPS= \033[32m{target_fps}\033[0m")
+            print(f" - FPS= \033[32m{format_fps(target_fps)}\033[0m")
             print(f"\n\033[33m======== Videos with different formats ========\033[0m\n")
             
             # List videos with different formats
             for info in video_infos:
-                if info['codec'] != target_codec or abs(info['fps'] - target_fps) > 0.001:
-                    print(f"  * \033[38;5;203m{os.path.basename(info['path'])}\033[0m  << Codec = : \033[38;5;215m{info['codec']}\033[0m, FPS = \033[38;5;215m{info['fps']}\033[0m")
+                if not matches_target_format(info, target_codec, target_fps):
+                    print(f"  * \033[38;5;203m{os.path.basename(info['path'])}\033[0m  << Codec = : \033[38;5;215m{info['signature'].codec}\033[0m, FPS = \033[38;5;215m{format_fps(info['signature'].fps)}\033[0m")
             # Ask user if they want to continue
             print("\nContinuing without re-encoding may cause playback issues.")
+            if stdin_list:
+                print("Not continuing: the input list came from stdin, so there is no one to confirm.")
+                return
             user_choice = input("Do you want to continue? (y/n): ").strip().lower()
             
             if user_choice != 'y' and user_choice != 'yes':
@@ -560,54 +2434,51 @@ def main():
         else:
             print("\nNo re-encoding needed. All videos have the same format.")
         
+        report = new_run_report('no-encode', profile)
+        report['outputs'] = get_output_paths(outputs)
+        for info in video_infos:
+            add_report_file(report, info, 'copy')
+        
         # Create a temporary file list for concatenation
         with tempfile.TemporaryDirectory() as temp_dir:
             # Concatenate all videos without re-encoding
-            if concatenate_videos([info['path'] for info in video_infos], output_file):
-                print(f"\nSuccess! Concatenated video saved to: {output_file}")
+            if run_async(concatenate_videos([info['path'] for info in video_infos], outputs, job_timeout)):
+                print(f"\nSuccess! Concatenated video saved to: {', '.join(report['outputs'])}")
+                report['success'] = True
+                if verify:
+                    run_async(verify_outputs(outputs, video_infos, report, job_timeout))
             else:
                 print("\nFailed to concatenate videos.")
+        write_run_report(report, report_path)
         
-        input("\nPress Enter to exit...")
+        if prompts:
+            input("\nPress Enter to exit...")
         return
     
     # If we get here, we're re-encoding
     # Find most common format with prefer_h264 option
     target_codec, target_fps = find_most_common_format(video_infos, prefer_h264)
-    print(f"\nMost common format: Codec={target_codec}, FPS={target_fps}")
+    print(f"\nMost common format: Codec={target_codec}, FPS={format_fps(target_fps)}")
+    print(f"Encoder profile: {profile['name']}")
     
-    # Create temporary directory for re-encoded files
-    with tempfile.TemporaryDirectory() as temp_dir:
-        final_file_list = []
-        
-        # Process each video
-        for info in video_infos:
-            if info['codec'] == target_codec and abs(info['fps'] - target_fps) < 0.001:
-                # No need to re-encode
-                print(f"{os.path.basename(info['path'])} already matches target format.")
-                final_file_list.append(info['path'])
-            else:
-                # Need to re-encode
-                print(f"{os.path.basename(info['path'])} needs re-encoding:")
-                print(f"  - Current: Codec={info['codec']}, FPS={info['fps']}")
-                print(f"  - Target: Codec={target_codec}, FPS={target_fps}")
-                
-                temp_output = get_temp_filename(info['path'], temp_dir)
-                if reencode_video(info['path'], temp_output, target_codec, target_fps):
-                    final_file_list.append(temp_output)
-                else:
-                    print(f"Skipping {os.path.basename(info['path'])} due to re-encoding failure.")
-        
-        # Concatenate all videos
-        if final_file_list:
-            if concatenate_videos(final_file_list, output_file):
-                print(f"\nSuccess! Concatenated video saved to: {output_file}")
-            else:
-                print("\nFailed to concatenate videos.")
-        else:
-            print("\nNo videos to concatenate after processing.")
+    report = new_run_report('concat', profile)
+    report['target'] = {'codec': target_codec, 'fps': format_fps(target_fps)}
+    report['encoder_args'] = get_encoder_args(target_codec, profile)
+    report['outputs'] = get_output_paths(outputs)
+    
+    run_async(encode_and_concatenate(video_infos, target_codec, target_fps, outputs, profile,
+                                     encode_jobs, report, job_timeout, verify,
+                                     scratch_dirs, scratch_policy, retime_tolerance))
+    write_run_report(report, report_path)
     
-    input("\nPress Enter to exit...")
+    if prompts:
+        input("\nPress Enter to exit...")
 
 if __name__ == "__main__":
-    main() 
+    try:
+        main()
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        # Cancellation already stopped the ffmpeg children and removed temporary files
+        print("\nInterrupted.")
+        sys.exit(130)
+